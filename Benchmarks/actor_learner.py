@@ -0,0 +1,36 @@
+"""
+Measures the training throughput of parallel actors (see ReinforcementLearning.actor_learner) as their number
+grows. Reports the episodes per second, the speedup over a single actor and the staleness of the policies
+the actors ran.
+
+Usage: python -m Benchmarks.actor_learner [--actors 1 2 4 ...] [--episodes N]
+"""
+import os
+from argparse import ArgumentParser
+from typing import List
+
+from ReinforcementLearning.actor_learner import train_actor_learner
+from ReinforcementLearning.q_learning_agent import QLearningAgent
+from ReinforcementLearning.q_learning_utils import alpha, discount, epsilon
+
+
+def actor_learner_benchmark(actors: List[int], n_episodes: int) -> None:
+    """ Prints the throughput and staleness of every number of actors """
+    print(f"{n_episodes} episodes, {os.cpu_count()} CPUs")
+    print(f"{'actors':>6} {'episodes/s':>11} {'speedup':>8} {'staleness':>10} {'max':>5}")
+    base = None
+    for n_actors in actors:
+        agent = QLearningAgent(alpha, epsilon, discount, [0, 1], seed=0)
+        stats = train_actor_learner(agent, n_episodes, n_actors, seed=0)
+        base = base or stats['episodes_per_second']
+        print(f"{n_actors:>6} {stats['episodes_per_second']:>11.1f} {stats['episodes_per_second'] / base:>8.2f} "
+              f"{stats['mean_staleness']:>10.1f} {stats['max_staleness']:>5}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Parallel actor-learner training throughput benchmark")
+    parser.add_argument("--actors", metavar='N', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Numbers of actor processes")
+    parser.add_argument("--episodes", metavar='N', type=int, default=200, help="Number of training episodes")
+    args = parser.parse_args()
+    actor_learner_benchmark(args.actors, args.episodes)
@@ -0,0 +1,67 @@
+"""
+Measures the accuracy and the speed of adaptive stepping (see Simulation tolerance): runs the same two-way
+intersection episodes with fixed steps and with every tolerance, under a fixed signal cycle, and reports the
+errors of the episodes' average wait times and the speedup. Fails if the error of any episode exceeds the
+bound of its tolerance, MAX_WAIT_ERRORS, stated in Simulation. As in the Q-learning validation, the wait
+times of the episodes which end in a collision aren't compared, and the episodes which collide with only one
+of the steppings are counted.
+
+Usage: python -m Benchmarks.adaptive [--tolerances 0.001 0.01 ...] [--episodes N]
+"""
+import sys
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from TrafficSimulator.Setups import two_way_intersection_setup
+
+CYCLE_ACTIONS = 5  # Actions between the signal switches, 15 seconds
+MAX_GEN = 50
+# {tolerance: the largest error of an episode's average wait time, in seconds}, over the first 100 seeds
+MAX_WAIT_ERRORS = {0.001: 0.05, 0.005: 0.15, 0.01: 0.5, 0.05: 0.5}
+
+
+def run_episode(seed: int, tolerance: Optional[float]) -> Tuple[float, bool, float]:
+    """ Runs an episode to its end. Returns its average wait time, whether it ended in a collision and its
+    duration in seconds """
+    sim = two_way_intersection_setup(MAX_GEN, seed=seed, tolerance=tolerance)
+    start = perf_counter()
+    i = 0
+    while not sim.completed:
+        sim.run(i % CYCLE_ACTIONS == 0)
+        i += 1
+    return sim.current_average_wait_time, sim.collision_detected, perf_counter() - start
+
+
+def adaptive_benchmark(tolerances: List[float], n_episodes: int) -> bool:
+    """ Prints the wait time errors, the collision mismatches and the speedup of every tolerance. Returns
+    whether the error of every episode is within the bound of its tolerance """
+    reference = [run_episode(seed, None) for seed in range(n_episodes)]
+    print(f"{n_episodes} episodes of {MAX_GEN} vehicles, average wait time "
+          f"{np.mean([wait_time for wait_time, collision, seconds in reference if not collision]):.2f}s, "
+          f"{sum(collision for _, collision, _ in reference)} collisions")
+    print(f"{'tolerance':>9} {'mean error':>11} {'max error':>10} {'bound':>7} {'collisions':>11} {'speedup':>8}")
+    passed = True
+    for tolerance in tolerances:
+        results = [run_episode(seed, tolerance) for seed in range(n_episodes)]
+        errors = [abs(wait_time - expected) for (wait_time, collision, _), (expected, expected_collision, _)
+                  in zip(results, reference) if not collision and not expected_collision]
+        n_mismatches = sum(collision != expected_collision for (_, collision, _), (_, expected_collision, _)
+                           in zip(results, reference))
+        speedup = sum(seconds for _, _, seconds in reference) / sum(seconds for _, _, seconds in results)
+        bound = MAX_WAIT_ERRORS.get(tolerance)
+        print(f"{tolerance:>9g} {np.mean(errors):>10.3f}s {max(errors):>9.3f}s "
+              f"{'-' if bound is None else f'{bound:g}s':>7} {n_mismatches:>11} {speedup:>8.2f}")
+        passed &= bound is None or max(errors) <= bound
+    return passed
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Adaptive stepping accuracy and speed benchmark")
+    parser.add_argument("--tolerances", metavar='T', type=float, nargs='+', default=list(MAX_WAIT_ERRORS),
+                        help="Position tolerances, meters")
+    parser.add_argument("--episodes", metavar='N', type=int, default=100, help="Number of episodes")
+    args = parser.parse_args()
+    sys.exit(0 if adaptive_benchmark(args.tolerances, args.episodes) else 1)
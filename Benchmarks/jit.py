@@ -0,0 +1,23 @@
+"""
+Measures the vehicle updates per second of every engine, including the jit engine (see
+TrafficSimulator.engine.JitEngine). Without Numba, the jit engine runs the NumPy update, which is what gets
+measured. The jit engine is checked against the object engine by TrafficSimulator/test_idm_kernel.py.
+
+Usage: python -m Benchmarks.jit [--grid RxC]
+"""
+from argparse import ArgumentParser
+
+from Benchmarks.scaling import measure
+from TrafficSimulator.engine import ENGINES, JitEngine
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Engines microbenchmark")
+    parser.add_argument("--grid", metavar='RxC', default='4x4', help="Benchmark grid size, rows x columns")
+    args = parser.parse_args()
+
+    print(f"Numba kernel: {'compiled' if JitEngine().compiled else 'not available'}")
+    n_rows, n_cols = (int(n) for n in args.grid.lower().split('x'))
+    for engine in ENGINES:
+        measure(1, 1, 35, engine, 1)  # Compiles the kernel and performs the one-time imports
+        updates_per_second = measure(n_rows, n_cols, 35, engine, 5)['updates/s']
+        print(f"{engine:>8}: {updates_per_second:>10.0f} vehicle updates/s")
@@ -0,0 +1,77 @@
+"""
+Measures how the simulation scales with the road network and the traffic: for every grid size and
+vehicle rate, runs a grid setup (see TrafficSimulator.Setups.grid) and reports the simulation speed,
+in ticks and vehicle updates per second, and the memory held by the simulation. Collisions don't end
+a benchmark run, they are counted and cleared.
+
+Usage: python -m Benchmarks.scaling [--grids 1x1 2x2 ...] [--rates 35 ...] [--engine object] [--actions N]
+"""
+import gc
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+from TrafficSimulator.Setups import grid_setup
+
+WARMUP_ACTIONS = 20  # Fills the grid with vehicles
+
+
+def _run(sim, n_actions: int) -> Tuple[int, int, int]:
+    """ Runs n actions, switching the signals every third action. Returns the number of ticks,
+    of vehicle updates and of collisions """
+    n_ticks, n_updates, n_collisions = 0, 0, 0
+    for i in range(n_actions):
+        t, n_vehicles = sim.t, sim.n_vehicles_on_map
+        sim.run(i % 3 == 0)
+        ticks = round((sim.t - t) / sim.dt)
+        n_ticks += ticks
+        n_updates += ticks * (n_vehicles + sim.n_vehicles_on_map) // 2
+        if sim.collision_detected:
+            sim.collision_detected = False
+            n_collisions += 1
+    return n_ticks, n_updates, n_collisions
+
+
+def measure(n_rows: int, n_cols: int, vehicle_rate: float, engine: str, n_actions: int) -> Dict[str, float]:
+    """ Returns the speed and memory measures of a grid """
+    grid_setup(n_rows, n_cols)  # Fills the conflict geometry cache, shared by the simulations
+    gc.collect()
+    tracemalloc.start()
+    sim = grid_setup(n_rows, n_cols, vehicle_rate, engine=engine, seed=0)
+    _run(sim, WARMUP_ACTIONS)
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = perf_counter()
+    n_ticks, n_updates, n_collisions = _run(sim, n_actions)
+    elapsed = perf_counter() - start
+    return {'roads': len(sim.roads), 'vehicles': sim.n_vehicles_on_map, 'ticks/s': n_ticks / elapsed,
+            'updates/s': n_updates / elapsed, 'memory KB': memory / 1024, 'collisions': n_collisions}
+
+
+def scaling_benchmark(grids: List[Tuple[int, int]], rates: List[float], engine: str, n_actions: int) -> None:
+    """ Prints the measures of every grid size and vehicle rate """
+    _run(grid_setup(1, 1, engine=engine), WARMUP_ACTIONS)  # One-time imports and allocations
+    columns = ('roads', 'vehicles', 'ticks/s', 'updates/s', 'memory KB', 'collisions')
+    print(f"{'grid':>6} {'rate':>6} " + ' '.join(f'{column:>10}' for column in columns))
+    for n_rows, n_cols in grids:
+        for rate in rates:
+            measures = measure(n_rows, n_cols, rate, engine, n_actions)
+            print(f"{f'{n_rows}x{n_cols}':>6} {rate:>6g} " + ' '.join(f'{measures[column]:>10.0f}'
+                                                                      for column in columns))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Grid network scaling benchmark")
+    parser.add_argument("--grids", metavar='RxC', nargs='+', default=['1x1', '2x2', '4x4', '8x8'],
+                        help="Grid sizes, rows x columns")
+    parser.add_argument("--rates", metavar='RATE', type=float, nargs='+', default=[20, 35, 50],
+                        help="Vehicle rates, vehicles per minute per boundary junction")
+    parser.add_argument("--engine", choices=['object', 'numpy'], default='object', help="Vehicle update engine")
+    parser.add_argument("--actions", metavar='N', type=int, default=10,
+                        help="Number of measured actions, 180 ticks each")
+    args = parser.parse_args()
+    grids = [tuple(int(n) for n in grid.lower().split('x')) for grid in args.grids]
+    scaling_benchmark(grids, args.rates, args.engine, args.actions)
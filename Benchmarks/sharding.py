@@ -0,0 +1,57 @@
+"""
+Measures the throughput of a sharded grid (see TrafficSimulator.sharded_simulation) as the number of
+shards, worker processes, grows. Reports the ticks per second and the speedup over a single shard.
+
+Usage: python -m Benchmarks.sharding [--grid 8x8] [--shards 1 2 4 ...] [--rate 35] [--actions N]
+"""
+import os
+from argparse import ArgumentParser
+from functools import partial
+from time import perf_counter
+from typing import List
+
+from TrafficSimulator.Setups.grid import grid_setup, grid_regions
+from TrafficSimulator.sharded_simulation import ShardedSimulation
+
+WARMUP_ACTIONS = 20  # Fills the grid with vehicles
+
+
+def measure(n_rows: int, n_cols: int, n_shards: int, vehicle_rate: float, n_actions: int) -> float:
+    """ Returns the ticks per second of a sharded grid """
+    sim = ShardedSimulation(partial(grid_setup, n_rows, n_cols, vehicle_rate, seed=0),
+                            grid_regions(n_rows, n_cols, n_shards))
+    try:
+        for i in range(WARMUP_ACTIONS):
+            sim.run(i % 3 == 0)
+        t = sim.t
+        start = perf_counter()
+        for i in range(n_actions):
+            sim.run(i % 3 == 0)
+        return (sim.t - t) / (1 / 60) / (perf_counter() - start)
+    finally:
+        sim.close()
+
+
+def sharding_benchmark(n_rows: int, n_cols: int, shards: List[int], vehicle_rate: float, n_actions: int) -> None:
+    """ Prints the throughput of every number of shards """
+    print(f"{n_rows}x{n_cols} grid, {os.cpu_count()} CPUs")
+    print(f"{'shards':>6} {'ticks/s':>10} {'speedup':>8}")
+    base = None
+    for n_shards in shards:
+        ticks_per_second = measure(n_rows, n_cols, n_shards, vehicle_rate, n_actions)
+        base = base or ticks_per_second
+        print(f"{n_shards:>6} {ticks_per_second:>10.0f} {ticks_per_second / base:>8.2f}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Sharded simulation throughput benchmark")
+    parser.add_argument("--grid", metavar='RxC', default='8x8', help="Grid size, rows x columns")
+    parser.add_argument("--shards", metavar='N', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Numbers of shards")
+    parser.add_argument("--rate", metavar='RATE', type=float, default=35,
+                        help="Vehicle rate, vehicles per minute per boundary junction")
+    parser.add_argument("--actions", metavar='N', type=int, default=10,
+                        help="Number of measured actions, 180 ticks each")
+    args = parser.parse_args()
+    n_rows, n_cols = (int(n) for n in args.grid.lower().split('x'))
+    sharding_benchmark(n_rows, n_cols, args.shards, args.rate, args.actions)
@@ -0,0 +1,63 @@
+"""
+Measures the cold start of a headless worker: every sample starts a fresh interpreter, imports
+TrafficSimulator, sets up a two-way intersection and runs an action. Fails if the median start
+time exceeds the budget, or if the GUI (pygame) or SciPy were imported.
+
+Usage: python -m Benchmarks.startup [--budget MS] [--repeat N]
+"""
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ('pygame', 'scipy')
+
+WORKER = f"""
+import sys
+from time import perf_counter
+start = perf_counter()
+import TrafficSimulator
+from TrafficSimulator.Setups import two_way_intersection_setup
+imported = perf_counter()
+two_way_intersection_setup(50).run(0)
+ran = perf_counter()
+heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+print(imported - start, ran - imported, ','.join(heavy))
+"""
+
+
+def sample() -> Dict[str, float]:
+    """ Starts a worker interpreter, returns its timings in seconds and the heavy modules it imported """
+    start = perf_counter()
+    output = subprocess.run([sys.executable, '-c', WORKER], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout.splitlines()[-1].split()
+    total = perf_counter() - start
+    return {'total': total, 'import': float(output[0]), 'first action': float(output[1]),
+            'heavy': output[2] if len(output) > 2 else ''}
+
+
+def startup_benchmark(budget: float, repeat: int) -> bool:
+    """ Prints the median timings of repeat samples, returns whether the start is within the budget (ms) """
+    samples: List[Dict] = [sample() for _ in range(repeat)]
+    for key in ('import', 'first action', 'total'):
+        print(f"{key.capitalize():>14}: {1000 * median(s[key] for s in samples):7.1f} ms")
+    heavy = {name for s in samples for name in s['heavy'].split(',') if name}
+    total = 1000 * median(s['total'] for s in samples)
+    if heavy:
+        print(f"Failed: imported {', '.join(sorted(heavy))}")
+    if total > budget:
+        print(f"Failed: {total:.1f} ms over the {budget:.0f} ms budget")
+    return not heavy and total <= budget
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Headless cold start benchmark")
+    parser.add_argument("--budget", metavar='MS', type=float, default=500,
+                        help="Median interpreter start to first action time budget, in milliseconds")
+    parser.add_argument("--repeat", metavar='N', type=int, default=10, help="Number of samples")
+    args = parser.parse_args()
+    sys.exit(0 if startup_benchmark(args.budget, args.repeat) else 1)
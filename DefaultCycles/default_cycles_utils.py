@@ -38,9 +38,9 @@ action_funcs = {'fc': fixed_cycle_action,
                 'lqf': longest_queue_action}
 
 
-def default_cycle(n_episodes: int, action_func_name: str, render):
+def default_cycle(n_episodes: int, action_func_name: str, render, seed: int = None):
     print(f"\n -- Running FC for {n_episodes} episodes  -- ")
-    environment: Environment = Environment()
+    environment: Environment = Environment(seed=seed)
     total_wait_time, total_collisions = 0, 0
     action_func = action_funcs[action_func_name]
     for episode in range(1, n_episodes + 1):
@@ -1,3 +1,5 @@
 from .environment import Environment
+from .batch_simulation import BatchSimulation
+from .q_table import QTable
 from .q_learning_agent import QLearningAgent
 from .q_learning_utils import q_learning
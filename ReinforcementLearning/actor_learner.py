@@ -0,0 +1,169 @@
+"""
+Trains a QLearningAgent with parallel actors: worker processes run Environment episodes with a copy of the
+agent's policy, and send their transitions to the learner, the calling process, which applies them with
+QLearningAgent.update and publishes the updated Q-table back to the actors.
+
+Usage: python -m ReinforcementLearning.actor_learner [.npz file] --episodes N --actors N --seed SEED
+"""
+import multiprocessing as mp
+import os
+from argparse import ArgumentParser
+from queue import Empty
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from numpy.random import SeedSequence
+
+from ReinforcementLearning.environment import Environment
+from ReinforcementLearning.q_learning_agent import QLearningAgent
+
+POLL_INTERVAL = 1  # Seconds between the checks of the actors while the learner waits for their transitions
+
+
+def _act(index: int, n_episodes: int, counter, version, table_name: str, table_shape: Tuple,
+         transitions: mp.Queue, hyperparameters: Tuple, actions: List, max_count: int, seed: SeedSequence,
+         engine: Union[str, object]) -> None:
+    """ The worker process of an actor: runs episodes until n_episodes were started by all the actors, and
+    sends the (actor, policy version, transitions) of every episode. Sends None once done """
+    memory, table = None, None
+    try:
+        memory = SharedMemory(table_name)
+        table = np.ndarray(table_shape, buffer=memory.buf)
+        agent_seed, environment_seed = seed.spawn(2)
+        agent = QLearningAgent(*hyperparameters, actions, agent_seed, max_count)
+        environment = Environment(engine, environment_seed)
+        policy_version = 0
+        while True:
+            with counter.get_lock():
+                if counter.value >= n_episodes:
+                    break
+                counter.value += 1
+            # The policy is only refreshed between episodes, so that an episode follows a single policy
+            with version.get_lock():
+                if version.value != policy_version:
+                    np.copyto(agent.q_table.values, table)
+                    policy_version = version.value
+            episode = []
+            state = environment.reset()
+            done = False
+            while not done:
+                action = agent.get_action(state)
+                new_state, reward, done, truncated = environment.step(action)
+                episode.append((state, action, new_state, reward))
+                state = new_state
+            transitions.put((index, policy_version, episode))
+    finally:
+        table = None  # Releases the table view before closing the shared memory
+        if memory:
+            memory.close()
+        transitions.put(None)
+
+
+def _check_actors(workers: List[mp.Process], n_learned: int, n_episodes: int) -> None:
+    """ Raises if an actor failed. An actor killed before its finally clause, by a signal or a crash, never
+    sends its None, so the learner would otherwise wait for it forever """
+    for index, worker in enumerate(workers):
+        if worker.exitcode not in (None, 0):
+            raise RuntimeError(f"Actor {index} exited with code {worker.exitcode} after {n_learned} of "
+                               f"{n_episodes} learned episodes")
+
+
+def train_actor_learner(agent: QLearningAgent, n_episodes: int, n_actors: Optional[int] = None,
+                        publish_every: Optional[int] = None, engine: Union[str, object] = 'object',
+                        seed: Union[None, int, SeedSequence] = None, report_every: Optional[int] = None) -> Dict:
+    """
+    Trains the agent for n_episodes episodes, run by n_actors processes (by default, one per CPU). The
+    learner publishes the Q-table every publish_every learned episodes (by default, n_actors), through shared
+    memory, and the actors act upon the latest published table from their next episode on. The staleness of
+    an episode is the number of episodes learned since the table it was run with was published, 0 for
+    serial training. Prints the progress every report_every learned episodes, if given.
+    Episodes are learned in the order they finish, so unlike the serial training, the result isn't
+    reproducible from the seed alone
+    :return: the number of episodes, seconds, episodes per second, mean and max staleness and number of
+    published tables
+    """
+    n_actors = n_actors or os.cpu_count()
+    publish_every = publish_every or n_actors
+    values = agent.q_table.values
+    memory = SharedMemory(create=True, size=values.nbytes)
+    table = np.ndarray(values.shape, buffer=memory.buf)
+    table[:] = values
+    counter, version = mp.Value('q', 0), mp.Value('q', 0)
+    # Bounded, so that the actors can't run far ahead of the learner
+    transitions = mp.Queue(4 * n_actors)
+    seed_sequence = seed if isinstance(seed, SeedSequence) else SeedSequence(seed)
+    hyperparameters = (agent.alpha, agent.epsilon, agent.discount)
+    workers: List[mp.Process] = []
+    n_learned, n_published, staleness_sum, max_staleness = 0, 0, 0, 0
+    start = perf_counter()
+    try:
+        for index, actor_seed in enumerate(seed_sequence.spawn(n_actors)):
+            worker = mp.Process(target=_act, args=(index, n_episodes, counter, version, memory.name, values.shape,
+                                                   transitions, hyperparameters, agent.actions,
+                                                   agent.q_table.max_count, actor_seed, engine), daemon=True)
+            worker.start()
+            workers.append(worker)
+        n_running = n_actors
+        next_check = perf_counter() + POLL_INTERVAL
+        while n_running:
+            if perf_counter() >= next_check:
+                _check_actors(workers, n_learned, n_episodes)
+                next_check = perf_counter() + POLL_INTERVAL
+            try:
+                message = transitions.get(timeout=POLL_INTERVAL)
+            except Empty:
+                continue
+            if message is None:
+                n_running -= 1
+                continue
+            index, policy_version, episode = message
+            staleness = n_learned - policy_version
+            staleness_sum += staleness
+            max_staleness = max(max_staleness, staleness)
+            for state, action, new_state, reward in episode:
+                agent.update(state, action, new_state, reward)
+            n_learned += 1
+            if not n_learned % publish_every:
+                with version.get_lock():
+                    table[:] = agent.q_table.values
+                    version.value = n_learned
+                n_published += 1
+            if report_every and not n_learned % report_every:
+                elapsed = perf_counter() - start
+                print(f"Episode {n_learned}. {elapsed:.0f}s, {n_learned / elapsed:.1f} episodes/s, "
+                      f"staleness {staleness_sum / n_learned:.1f} episodes (max {max_staleness})")
+        if n_learned < n_episodes:
+            raise RuntimeError(f"The actors stopped after {n_learned} of {n_episodes} episodes, "
+                               f"see their errors above")
+    except BaseException:
+        for worker in workers:
+            worker.terminate()
+        raise
+    finally:
+        for worker in workers:
+            worker.join()
+        table = None  # Releases the table view before closing the shared memory
+        memory.close()
+        memory.unlink()
+    elapsed = perf_counter() - start
+    return {'n_episodes': n_learned, 'seconds': elapsed, 'episodes_per_second': n_learned / elapsed,
+            'mean_staleness': staleness_sum / max(n_learned, 1), 'max_staleness': max_staleness,
+            'n_published': n_published}
+
+
+if __name__ == '__main__':
+    from ReinforcementLearning.q_learning_utils import alpha, discount, epsilon, train_agent_parallel
+
+    parser = ArgumentParser(description="Trains a Q-agent with parallel actors")
+    parser.add_argument("path", help="Output Q-table .npz file")
+    parser.add_argument("--episodes", metavar='N', type=int, default=10000, help="Number of training episodes")
+    parser.add_argument("--actors", metavar='N', type=int, default=None,
+                        help="Number of actor processes, one per CPU by default")
+    parser.add_argument("--publish-every", metavar='N', type=int, default=None,
+                        help="Learned episodes between the Q-tables published to the actors, --actors by default")
+    parser.add_argument("--seed", metavar='SEED', type=int, default=None, help="Seeds the actors")
+    args = parser.parse_args()
+    q_agent = QLearningAgent(alpha, epsilon, discount, Environment().action_space, args.seed)
+    train_agent_parallel(q_agent, args.path, args.episodes, args.actors, args.publish_every, args.seed)
@@ -0,0 +1,68 @@
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from numpy.random import SeedSequence
+
+from ReinforcementLearning.environment import Environment
+from TrafficSimulator import run_lockstep
+from TrafficSimulator.engine import ENGINES
+
+
+def to_state(row: np.ndarray) -> Tuple:
+    """ Converts a row of a states array to an Environment.get_state() tuple """
+    traffic_signal_state, n_direction_1_vehicles, n_direction_2_vehicles, non_empty_junction = row
+    return (bool(traffic_signal_state), int(n_direction_1_vehicles), int(n_direction_2_vehicles),
+            bool(non_empty_junction))
+
+
+class BatchSimulation:
+    """
+    Steps n independent two-way intersection episodes together. The episodes share a single engine,
+    so with the NumPy engine the vehicles of all the episodes are updated in one vectorized pass per tick.
+    Finished episodes are reset automatically, and their results are appended to self.results
+    """
+
+    def __init__(self, n: int, engine: Union[str, object] = 'numpy', seed: Union[None, int, SeedSequence] = None,
+                 demand: Optional[np.ndarray] = None):
+        self.n: int = n
+        engine = ENGINES[engine]() if isinstance(engine, str) else engine
+        seed_sequence = seed if isinstance(seed, SeedSequence) else SeedSequence(seed)
+        # With a demand set, environment i replays the traces i, i + n, i + 2n...
+        self.environments: List[Environment] = [
+            Environment(engine, environment_seed, None if demand is None else demand[i::n])
+            for i, environment_seed in enumerate(seed_sequence.spawn(n))]
+        # The states to act upon. A row is an Environment.get_state() tuple, see to_state()
+        self.states: np.ndarray = np.zeros((n, 4), dtype=int)
+        # (average wait time, collision detected) of every finished episode
+        self.results: List[Tuple[float, bool]] = []
+
+    @property
+    def n_finished(self) -> int:
+        """ Returns the number of finished episodes """
+        return len(self.results)
+
+    def reset(self) -> np.ndarray:
+        """ Starts a new episode in every environment, returns the initial states """
+        for i, environment in enumerate(self.environments):
+            self.states[i] = environment.reset()
+        self.results = []
+        return self.states.copy()
+
+    def step(self, actions: List[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Applies an action in every environment
+        :return: the new states, rewards and terminal state indicators. The new state of a finished episode
+        is its terminal state, while self.states holds the initial state of the episode that replaced it
+        """
+        run_lockstep([environment.sim for environment in self.environments], actions)
+        new_states = np.empty_like(self.states)
+        rewards = np.empty(self.n)
+        dones = np.empty(self.n, dtype=bool)
+        for i, environment in enumerate(self.environments):
+            new_state, rewards[i], dones[i], truncated = environment.observe()
+            new_states[i] = new_state
+            if dones[i]:
+                sim = environment.sim
+                self.results.append((sim.current_average_wait_time, sim.collision_detected))
+                new_state = environment.reset()
+            self.states[i] = new_state
+        return new_states, rewards, dones
@@ -1,19 +1,38 @@
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Union
 
-from TrafficSimulator import Simulation
+import numpy as np
+from numpy.random import SeedSequence
+
+from TrafficSimulator import RenderPolicy, Simulation
 from TrafficSimulator.Setups import two_way_intersection_setup
 
 
 class Environment:
-    def __init__(self):
+    def __init__(self, engine: Union[str, object] = 'object', seed: Union[None, int, SeedSequence] = None,
+                 demand: Optional[np.ndarray] = None, tolerance: Optional[float] = None):
         self.action_space: List = [0, 1]
         self.sim: Optional[Simulation] = None
         self.max_gen: int = 50
+        self.engine: Union[str, object] = engine  # Simulation vehicle update engine name or instance
         self._vehicles_on_inbound_roads: int = 0
+        # Every episode is seeded by a child of the environment seed, so environments with the same
+        # seed run the same sequence of episodes
+        self.seed_sequence: SeedSequence = seed if isinstance(seed, SeedSequence) else SeedSequence(seed)
+        # A demand set to replay instead of sampling arrivals, an arrival trace per episode in turn,
+        # see TrafficSimulator.arrival_trace
+        self.demand: Optional[np.ndarray] = demand
+        if demand is not None and demand.shape[-1] < self.max_gen:
+            raise ValueError(f'The demand set traces hold {demand.shape[-1]} arrivals, fewer than the '
+                             f'{self.max_gen} vehicles of an episode')
+        self.n_episodes: int = 0
+        self.tolerance: Optional[float] = tolerance  # Adaptive stepping tolerance, see Simulation
 
     def step(self, step_action) -> Tuple[Tuple, float, bool, bool]:
         self.sim.run(step_action)
+        return self.observe()
 
+    def observe(self) -> Tuple[Tuple, float, bool, bool]:
+        """ Returns the state, reward and termination indicators after the simulation ran an action """
         new_state: Tuple = self.get_state()
 
         step_reward: float = self.get_reward(new_state)
@@ -37,16 +56,16 @@ class Environment:
         of vehicles in the 1st direction, the number of vehicles in the 2nd direction,
         and an indicator of whether the junction is empty or not """
         state = []
-        for traffic_signal in self.sim.traffic_signals:
+        for traffic_signal, group_counts in zip(self.sim.traffic_signals, self.sim.signal_group_counts):
             junction = []
             traffic_signal_state = traffic_signal.current_cycle[0]
             junction.append(traffic_signal_state)
 
-            for direction in traffic_signal.roads:
-                junction.append(sum(len(road.vehicles) for road in direction))
+            # The running vehicle counts of the directions, kept by the simulation
+            junction.extend(group_counts)
 
             n_direction_1_vehicles, n_direction_2_vehicles = junction[1], junction[2]
-            out_bound_vehicles = sum(len(self.sim.roads[i].vehicles) for i in self.sim.outbound_roads)
+            out_bound_vehicles = self.sim.n_outbound_vehicles
             non_empty_junction = bool(self.sim.n_vehicles_on_map - out_bound_vehicles -
                                       n_direction_1_vehicles - n_direction_2_vehicles)
             junction.append(non_empty_junction)
@@ -62,10 +81,18 @@ class Environment:
         flow_change = self._vehicles_on_inbound_roads - n_direction_1_vehicles - n_direction_2_vehicles
         return flow_change
 
-    def reset(self, render=False) -> Tuple:
-        self.sim = two_way_intersection_setup(self.max_gen)
+    def reset(self, render: Union[bool, RenderPolicy] = False, seed: Union[None, int, SeedSequence] = None) -> Tuple:
+        """ Starts a new episode, seeded by the given seed or else by the next episode seed. Renders it if
+        render is True, or under the given render policy """
+        if self.sim:
+            self.sim.detach()
+        if seed is None:
+            seed = self.seed_sequence.spawn(1)[0]
+        arrivals = None if self.demand is None else self.demand[self.n_episodes % len(self.demand)]
+        self.n_episodes += 1
+        self.sim = two_way_intersection_setup(self.max_gen, self.engine, seed, arrivals, self.tolerance)
         if render:
-            self.sim.init_gui()
+            self.sim.init_gui(render if isinstance(render, RenderPolicy) else None)
         init_state = self.get_state()
         self._vehicles_on_inbound_roads = 0  # Reset the counter
         return init_state
@@ -0,0 +1,41 @@
+"""
+Converts a Q-values text file, the str() of a {(state, action): Q-value} dict written by the former
+save_q_values, to the binary Q-table format (see ReinforcementLearning.q_table.QTable.save). The text is
+parsed as a literal, never evaluated.
+
+Usage: python -m ReinforcementLearning.migrate_q_values [text file] [.npz file] --episodes N [--compressed]
+"""
+import ast
+import os
+from argparse import ArgumentParser
+from typing import Optional
+
+from ReinforcementLearning.environment import Environment
+from ReinforcementLearning.q_learning_utils import alpha, discount, epsilon
+from ReinforcementLearning.q_table import QTable
+
+
+def migrate(text_path: str, path: Optional[str] = None, n_episodes: Optional[int] = None,
+            compressed: bool = False) -> str:
+    """ Converts a Q-values text file, by default to the .npz file of the same name. Returns its path.
+    The hyperparameters recorded are those of q_learning_utils, which the text files were trained with """
+    path = path or os.path.splitext(text_path)[0] + '.npz'
+    with open(text_path) as file:
+        q_values = ast.literal_eval(file.read())
+    actions = Environment().action_space
+    q_table = QTable(len(actions))
+    q_table.update_from_dict(q_values, actions)
+    q_table.save(path, actions, compressed, n_episodes=n_episodes,
+                 hyperparameters={'alpha': alpha, 'epsilon': epsilon, 'discount': discount})
+    return path
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Converts a Q-values text file to the binary Q-table format")
+    parser.add_argument("text_path", help="Q-values text file")
+    parser.add_argument("path", nargs='?', default=None, help="Q-table .npz file, by default named after the text file")
+    parser.add_argument("--episodes", metavar='N', type=int, default=None, help="Number of training episodes")
+    parser.add_argument("--compressed", action='store_true',
+                        help="Compresses the arrays, for small tables such as the shipped ones")
+    args = parser.parse_args()
+    print(f"Converted {args.text_path} to {migrate(args.text_path, args.path, args.episodes, args.compressed)}")
@@ -1,33 +1,48 @@
-import random
+from typing import Dict, Tuple
+
+import numpy as np
+
+from ReinforcementLearning.q_table import MAX_COUNT, QTable
 
 
 class QLearningAgent:
-    def __init__(self, alpha, epsilon, discount, actions):
+    def __init__(self, alpha, epsilon, discount, actions, seed=None, max_count: int = MAX_COUNT):
         self.alpha = float(alpha)
         self.epsilon = float(epsilon)
         self.discount = float(discount)
         self.actions = actions
-        self.q_values = {}
+        # The Q-values, with a column per action, see QTable
+        self.q_table: QTable = QTable(len(actions), max_count)
+        self._columns: Dict = {action: j for j, action in enumerate(actions)}
+        self.rng = np.random.default_rng(seed)  # Exploration and tie-breaking random stream
+
+    @property
+    def q_values(self) -> Dict[Tuple, float]:
+        """ The visited Q-values, as a {(state, action): Q-value} dict """
+        return self.q_table.to_dict(self.actions)
+
+    @q_values.setter
+    def q_values(self, q_values: Dict[Tuple, float]) -> None:
+        self.q_table = QTable(len(self.actions), self.q_table.max_count)
+        self.q_table.update_from_dict(q_values, self.actions)
 
     def get_qvalue(self, state, action):
-        if (state, action) not in self.q_values:
-            return 0.0
-        return self.q_values[(state, action)]
+        return self.q_table.values.item(self.q_table.encode(state), self._columns[action])
 
     def get_value(self, state):
-        action_vals = [self.get_qvalue(state, action) for action in self.actions]
-        random.shuffle(action_vals)
-        return max(action_vals)
+        # A row holds a few actions, reduced faster as a list than as an array
+        return max(self.q_table.values[self.q_table.encode(state)].tolist())
 
     def get_policy(self, state):
         """
-          Compute the best action to take in a state. If there are no legal 
-          actions, which is the case at the terminal state, returns None.
+          Compute the best action to take in a state, breaking ties at random
         """
-        action_vals = [(action, self.get_qvalue(state, action)) for action in self.actions]
-        max_val = max([self.get_qvalue(state, action) for action in self.actions])
-        best_actions = [action for action, val in action_vals if val == max_val]
-        return random.choice(best_actions)
+        q_values = self.q_table.values[self.q_table.encode(state)].tolist()
+        max_value = max(q_values)
+        best_actions = [action for action, value in zip(self.actions, q_values) if value == max_value]
+        if len(best_actions) == 1:
+            return best_actions[0]
+        return best_actions[self.rng.integers(len(best_actions))]
 
     def get_action(self, state):
         """
@@ -37,18 +52,31 @@ class QLearningAgent:
           no legal actions, which is the case at the terminal state, 
           chooses None as the action
         """
-        r = random.random()
+        r = self.rng.random()
 
         if r < self.epsilon:
-            return random.choice(self.actions)
+            return self.actions[self.rng.integers(len(self.actions))]
 
         return self.get_policy(state)
 
+    def get_actions(self, states: np.ndarray) -> np.ndarray:
+        """ Returns the actions of get_action for the states of an array whose rows are state tuples,
+        at once """
+        q_values = self.q_table.values[self.q_table.encode_rows(states)]
+        # The best action of every state, ties broken at random
+        best = q_values == q_values.max(axis=1, keepdims=True)
+        columns = np.argmax(best * self.rng.random(q_values.shape), axis=1)
+        explore = self.rng.random(len(columns)) < self.epsilon
+        columns[explore] = self.rng.integers(len(self.actions), size=np.count_nonzero(explore))
+        return np.asarray(self.actions)[columns]
+
     def update(self, state, action, next_state, reward):
         """
           The parent class calls this to observe a
           state = action => nextState and reward transition.
         """
-        curr_q_val = self.get_qvalue(state, action)
-        self.q_values[(state, action)] = (1 - self.alpha) * curr_q_val + self.alpha * (
+        values = self.q_table.values
+        i, j = self.q_table.encode(state), self._columns[action]
+        values[i, j] = (1 - self.alpha) * values.item(i, j) + self.alpha * (
                 reward + self.discount * self.get_value(next_state))
+        self.q_table.visited[i, j] = True
@@ -1,5 +1,9 @@
 # import time
-from ReinforcementLearning import Environment, QLearningAgent
+import os
+from typing import Dict, Optional
+
+from ReinforcementLearning import Environment, QLearningAgent, BatchSimulation, QTable
+from ReinforcementLearning.batch_simulation import to_state
 
 # Hyper-parameters
 alpha = 0.1
@@ -7,17 +11,19 @@ discount = 0.6
 epsilon = 0.1
 
 
-def save_q_values(path, q_values):
-    with open(path, 'w+') as f:
-        f.write(str(q_values))
+def save_q_table(path, agent, n_episodes: int) -> None:
+    """ Saves the agent's Q-table, with its hyperparameters and number of training episodes, see QTable.save """
+    agent.q_table.save(path, agent.actions, n_episodes=n_episodes,
+                       hyperparameters={'alpha': agent.alpha, 'epsilon': agent.epsilon, 'discount': agent.discount})
 
 
-def get_q_values(path):
-    q_values_dict = ""
-    with open(path, 'r') as f:
-        for i in f.readlines():
-            q_values_dict = i  # string
-    return q_values_dict
+def load_q_table(path, agent) -> Dict:
+    """ Sets the agent's Q-table from a saved one, returns its header """
+    q_table, header = QTable.load(path)
+    if header['actions'] != list(agent.actions):
+        raise ValueError(f"The Q-table {path} has the actions {header['actions']}, not {agent.actions}")
+    agent.q_table = q_table
+    return header
 
 
 def train_agent(agent, environment, path, n_episodes: int, render: bool = False):
@@ -49,7 +55,39 @@ def train_agent(agent, environment, path, n_episodes: int, render: bool = False)
         #         f"Total: {total:.0f}s. Expected: {expected:.0f}s")
         #     current_time = time.time()
 
-    save_q_values(path, agent.q_values)
+    save_q_table(path, agent, n_episodes)
+    print(" -- Training finished -- ")
+
+
+def train_agent_batch(agent, batch: BatchSimulation, path, n_episodes: int):
+    """ Trains the agent on the lockstep episodes of a batch simulation """
+    print(f"\n -- Training Q-agent for {n_episodes} episodes, {batch.n} at a time -- ")
+    states = batch.reset()
+
+    while batch.n_finished < n_episodes:
+        actions = agent.get_actions(states).tolist()
+        new_states, rewards, dones = batch.step(actions)
+        for state, action, new_state, reward in zip(states, actions, new_states, rewards):
+            agent.update(to_state(state), action, to_state(new_state), reward)
+        states = batch.states.copy()
+
+    save_q_table(path, agent, n_episodes)
+    print(" -- Training finished -- ")
+
+
+def train_agent_parallel(agent, path, n_episodes: int, n_actors: Optional[int] = None,
+                         publish_every: Optional[int] = None, seed: int = None):
+    """ Trains the agent with parallel actor processes, see train_actor_learner """
+    # Imported here, as the actor_learner module runs this function
+    from ReinforcementLearning.actor_learner import train_actor_learner
+    n_actors = n_actors or os.cpu_count()
+    print(f"\n -- Training Q-agent for {n_episodes} episodes with {n_actors} actors -- ")
+    stats = train_actor_learner(agent, n_episodes, n_actors, publish_every, seed=seed,
+                                report_every=max(1, n_episodes // 20))
+    print(f"{stats['n_episodes']} episodes in {stats['seconds']:.0f}s, {stats['episodes_per_second']:.1f} "
+          f"episodes/s. Staleness: {stats['mean_staleness']:.1f} episodes on average, {stats['max_staleness']} "
+          f"at most, {stats['n_published']} Q-tables published")
+    save_q_table(path, agent, n_episodes)
     print(" -- Training finished -- ")
 
 
@@ -86,12 +124,14 @@ def validate_agent(agent, environment, n_episodes: int, render: bool = False):
     print(f"Average collisions per episode: {total_collisions / n_episodes:.2f}")
 
 
-def q_learning(n_episodes: int, render: bool):
-    env: Environment = Environment()
+def q_learning(n_episodes: int, render: bool, seed: int = None):
+    env: Environment = Environment(seed=seed)
     actions = env.action_space
-    q_agent = QLearningAgent(alpha, epsilon, discount, actions)
+    q_agent = QLearningAgent(alpha, epsilon, discount, actions, seed)
     n_train_episodes = 10000
-    file_name = f"ReinforcementLearning/Traffic_q_values_{n_train_episodes}.txt"
+    file_name = f"ReinforcementLearning/Traffic_q_values_{n_train_episodes}.npz"
     # train_agent(q_agent, env, file_name, n_train_episodes, render=False)
-    q_agent.q_values = eval(get_q_values(file_name))
+    # train_agent_batch(q_agent, BatchSimulation(64), file_name, n_train_episodes)
+    # train_agent_parallel(q_agent, file_name, n_train_episodes, seed=seed)
+    load_q_table(file_name, q_agent)
     validate_agent(q_agent, env, n_episodes, render)
@@ -0,0 +1,108 @@
+import json
+import struct
+import zipfile
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+MAX_COUNT = 50  # The largest vehicle count bin, Environment.max_gen vehicles per episode
+FORMAT = 'q-table'
+FORMAT_VERSION = 1  # Incremented upon incompatible changes of the saved arrays or header
+STATE_FIELDS = ['traffic_signal_state', 'n_direction_1_vehicles', 'n_direction_2_vehicles', 'non_empty_junction']
+
+
+class QTable:
+    """
+    Dense Q-values of Environment.get_state() states: a float array of shape (n_states, n_actions), indexed
+    by the integer encoding of the state tuples (traffic signal state, direction 1 vehicle count, direction 2
+    vehicle count, non-empty junction). Vehicle counts above max_count share the last bin. The visited
+    array marks the updated entries, the only ones of the sparse form, see to_dict()
+    """
+
+    def __init__(self, n_actions: int, max_count: int = MAX_COUNT):
+        self.max_count: int = max_count
+        self.n_bins: int = max_count + 1
+        self.n_states: int = 2 * self.n_bins * self.n_bins * 2
+        self.values: np.ndarray = np.zeros((self.n_states, n_actions))
+        self.visited: np.ndarray = np.zeros((self.n_states, n_actions), dtype=bool)
+
+    def encode(self, state: Tuple) -> int:
+        """ Returns the index of a state tuple """
+        traffic_signal_state, n_direction_1_vehicles, n_direction_2_vehicles, non_empty_junction = state
+        n_bins = self.n_bins
+        return (((traffic_signal_state * n_bins + min(n_direction_1_vehicles, self.max_count)) * n_bins +
+                 min(n_direction_2_vehicles, self.max_count)) * 2 + non_empty_junction)
+
+    def encode_rows(self, states: np.ndarray) -> np.ndarray:
+        """ Returns the indexes of the states of an array whose rows are state tuples """
+        states = np.asarray(states, dtype=np.intp)
+        counts = np.minimum(states[:, 1:3], self.max_count)
+        return ((states[:, 0] * self.n_bins + counts[:, 0]) * self.n_bins + counts[:, 1]) * 2 + states[:, 3]
+
+    def decode(self, index: int) -> Tuple:
+        """ Returns the state tuple of an index, with the vehicle counts of its bins """
+        index, non_empty_junction = divmod(index, 2)
+        index, n_direction_2_vehicles = divmod(index, self.n_bins)
+        traffic_signal_state, n_direction_1_vehicles = divmod(index, self.n_bins)
+        return bool(traffic_signal_state), n_direction_1_vehicles, n_direction_2_vehicles, bool(non_empty_junction)
+
+    def to_dict(self, actions: List) -> Dict[Tuple, float]:
+        """ Returns the visited entries as a {(state, action): Q-value} dict """
+        return {(self.decode(int(i)), actions[j]): float(self.values[i, j])
+                for i, j in zip(*np.nonzero(self.visited))}
+
+    def save(self, path: str, actions: List, compressed: bool = False, **metadata) -> None:
+        """ Saves the table to an .npz file: the values and visited arrays, and a JSON header describing the
+        format version, the state encoding and the actions, with the given metadata. The arrays are stored
+        uncompressed, so that load() memory-maps them, unless compressed is True, which suits small tables """
+        header = {'format': FORMAT, 'version': FORMAT_VERSION,
+                  'encoding': {'state': STATE_FIELDS, 'max_count': self.max_count},
+                  'actions': actions, **metadata}
+        save = np.savez_compressed if compressed else np.savez
+        save(path, values=self.values, visited=self.visited, header=np.array(json.dumps(header)))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> Tuple['QTable', Dict]:
+        """ Loads a table saved by save(), returns it with its header. By default, uncompressed arrays are
+        memory-mapped copy-on-write: the table reads its entries from the file as they're accessed, and its
+        updates aren't written back """
+        with np.load(path) as arrays:
+            header = json.loads(str(arrays['header']))
+            if header.get('format') != FORMAT or header.get('version') != FORMAT_VERSION:
+                raise ValueError(f"{path} isn't a version {FORMAT_VERSION} Q-table")
+            table = cls(len(header['actions']), header['encoding']['max_count'])
+            mapped = _memmap_npz(path, ['values', 'visited']) if mmap else {}
+            table.values = mapped['values'] if 'values' in mapped else arrays['values']
+            table.visited = mapped['visited'] if 'visited' in mapped else arrays['visited']
+        return table, header
+
+    def update_from_dict(self, q_values: Dict[Tuple, float], actions: List) -> None:
+        """ Sets the entries of a {(state, action): Q-value} dict """
+        columns = {action: j for j, action in enumerate(actions)}
+        for (state, action), value in q_values.items():
+            i, j = self.encode(state), columns[action]
+            self.values[i, j] = value
+            self.visited[i, j] = True
+
+
+def _memmap_npz(path: str, names: List[str]) -> Dict[str, np.ndarray]:
+    """ Returns the arrays of an .npz file stored uncompressed, memory-mapped copy-on-write. Compressed
+    arrays are left out """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as file:
+        for name in names:
+            info = archive.getinfo(name + '.npy')
+            if info.compress_type != zipfile.ZIP_STORED:
+                continue
+            # The .npy data follows the local file header, whose name and extra field lengths end it
+            file.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', file.read(4))
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(file)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else \
+                np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(file)
+            # A plain array view of the map, whose indexing is as fast as an array's
+            arrays[name] = np.memmap(path, dtype, mode='c', offset=file.tell(), shape=shape,
+                                     order='F' if fortran_order else 'C').view(np.ndarray)
+    return arrays
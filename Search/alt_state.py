@@ -5,7 +5,6 @@ from typing import Set, Dict, Optional
 import numpy
 
 from TrafficSimulator import Simulation
-from TrafficSimulator.Setups.two_way_intersection import *
 
 
 class Gstate:
@@ -17,16 +16,7 @@ class Gstate:
         self.act_cycle = 0
         self.max_c = max_c
         self.score = 0
-        self.my_sim = Simulation(sim.max_gen)
-        self.my_sim.n_vehicles_generated = sim.n_vehicles_generated
-        self.my_sim.n_vehicles_on_map = sim.n_vehicles_on_map
-        self.my_sim._inbound_roads = sim.inbound_roads
-        self.my_sim._outbound_roads = sim.outbound_roads
-        self.my_sim._non_empty_roads = copy.deepcopy(sim.non_empty_roads)
-        self.my_sim.max_gen = sim.max_gen
-        self.my_sim.collision_detected = sim.collision_detected
-        self.my_sim._waiting_times_sum = sim._waiting_times_sum
-        self.copy_elems(sim)
+        self.my_sim = sim.fork()
         self.v_location_before = dict()
         self.v_location_after = dict()
         self.penalty = 1
@@ -34,15 +24,19 @@ class Gstate:
         self.red = []
         self.passed_for_roads = dict()
 
-    def copy_elems(self, sim):
+    def fork(self) -> 'Gstate':
         """
-        Helper function for the constructor to help copy certain attributes
-        from the running simulation
+        Returns an independent copy of the state, with a fork of its
+        simulation
         """
-        self.my_sim.roads = copy.deepcopy(sim.roads)
-        self.my_sim.add_generator(VEHICLE_RATE, PATHS)
-        self.my_sim.traffic_signals = [self.my_sim.roads[0].traffic_signal]
-        self.my_sim.add_intersections(INTERSECTIONS_DICT)
+        state = copy.copy(self)
+        state.my_sim = self.my_sim.fork()
+        state.v_location_before = copy.deepcopy(self.v_location_before)
+        state.v_location_after = copy.deepcopy(self.v_location_after)
+        state.green = list(self.green)
+        state.red = list(self.red)
+        state.passed_for_roads = dict(self.passed_for_roads)
+        return state
 
     def min_optimal_score(self):
         """
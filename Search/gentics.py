@@ -1,9 +1,8 @@
-import copy
-import random
 import typing
 
+import numpy as np
+
 from Search.alt_state import Gstate
-from TrafficSimulator.window import *
 from TrafficSimulator.Setups.two_way_intersection import *
 
 INIT_SOLUTION_5 = [[0, 0, 0, 1, 0], [0, 0, 1, 0, 0], [0, 0, 0, 0, 1],
@@ -65,7 +64,7 @@ def check_unavoidable(state: Gstate):
     """
     Checks if there will be an unavoidable collision
     """
-    cs = copy.deepcopy(state)
+    cs = state.fork()
     cs.apply_action(0)
     if cs.abrupt():
         return True
@@ -76,15 +75,17 @@ class Genetics:
     """
     """
 
-    def __init__(self, solution_length, action_space):
+    def __init__(self, solution_length, action_space, seed=None):
         """
 
         :param solution_length: a number ranges from 3-6
         :param action_space: the action space for the mutation
+        :param seed: the seed or numpy Generator of the mutation random stream
         """
         self.possible_solutions = []
         self.solution_length = solution_length
         self.action_space = action_space
+        self.rng = np.random.default_rng(seed)
 
     def generate_innit_solution(self) -> None:
         """
@@ -101,7 +102,7 @@ class Genetics:
         :param state: a given state of the running simulation
         """
         for sol in self.possible_solutions:
-            cs = copy.deepcopy(state)
+            cs = state.fork()
             sol.evaluate(cs)
 
     def cross_over(self) -> None:
@@ -130,11 +131,11 @@ class Genetics:
         """
         e = 0
         for sol in self.possible_solutions:
-            e = random.random()
+            e = self.rng.random()
             if e > 0.7:
                 sol.solution[
-                    random.randrange(self.solution_length)] = random.choice(
-                    self.action_space)
+                    self.rng.integers(self.solution_length)] = self.action_space[
+                    self.rng.integers(len(self.action_space))]
 
     def failed_fit(self, bar) -> bool:
         """
@@ -2,24 +2,28 @@ import copy
 import time
 
 import numpy as np
+from numpy.random import SeedSequence
 
 from Search.gentics import Genetics
 from Search.alt_state import Gstate
 from TrafficSimulator.Setups.two_way_intersection import two_way_intersection_setup
+from TrafficSimulator.render_policy import RenderPolicy
 
 Chosen_Length = 5
 ACTION_SPACE = [0, 1]
 MAX_GEN = 50
 
 
-def sim_run(render):
+def sim_run(render, seed=None, rng=None):
     """
     Runs one episode of simulation using the search method
+    :param seed: the simulation seed
+    :param rng: the random stream of the search
     """
-    g = Genetics(Chosen_Length, ACTION_SPACE)
-    sim = two_way_intersection_setup(MAX_GEN)
+    g = Genetics(Chosen_Length, ACTION_SPACE, rng)
+    sim = two_way_intersection_setup(MAX_GEN, seed=seed)
     if render:
-        sim.init_gui()
+        sim.init_gui(render if isinstance(render, RenderPolicy) else None)
     while not (sim.gui_closed or sim.completed):
         # Creating a snapshot of the running simulation
         current_state = Gstate(sim, g.solution_length)
@@ -38,15 +42,17 @@ def sim_run(render):
     return sim.current_average_wait_time
 
 
-def search(episodes, render):
+def search(episodes, render, seed=None):
     """
-    Runs episodes of simulations
+    Runs episodes of simulations, every episode is seeded by a child of
+    the given seed, as in ReinforcementLearning.Environment
     """
     sum_scores = 0
     count_collisions = 0
     score_list = []
-    for i in range(episodes):
-        number = sim_run(render)
+    rng = np.random.default_rng(seed)
+    for i, episode_seed in enumerate(SeedSequence(seed).spawn(episodes)):
+        number = sim_run(render, episode_seed, rng)
         if number == -1:
             print(f"Episode {i + 1} ended due to collision")
             count_collisions += 1
@@ -1 +1,2 @@
 from .two_way_intersection import two_way_intersection_setup
+from .grid import grid_setup
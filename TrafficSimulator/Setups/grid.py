@@ -0,0 +1,124 @@
+from typing import Dict, List, Set, Tuple
+
+from TrafficSimulator import Simulation
+from TrafficSimulator.Setups.two_way_intersection import CURVED_ROADS, CURVED_INTERSECTIONS_DICT, \
+    SIGNAL_ROADS, CYCLE, SLOW_DISTANCE, SLOW_FACTOR, STOP_DISTANCE, VEHICLE_RATE, b, length
+
+# The distance between the centers of adjacent junctions. The outbound road of a junction
+# is then exactly the inbound road of its neighbour, and both junctions share it
+SPACING = 2 * b + length
+
+# Junction sides, by the local index of their inbound road. The local indexes are those of
+# two_way_intersection.CURVED_ROADS: the outbound road of a side is 4 + its side
+WEST, SOUTH, EAST, NORTH = 0, 1, 2, 3
+NEIGHBOURS = {WEST: (0, -1), SOUTH: (1, 0), EAST: (0, 1), NORTH: (-1, 0)}  # {side: (row step, column step)}
+
+# {entry side: [(local road across the junction, exit side)]}, going straight or turning right
+MOVES = {
+    WEST: [(8, EAST), (12, SOUTH)],
+    SOUTH: [(9, NORTH), (14, EAST)],
+    EAST: [(10, WEST), (16, NORTH)],
+    NORTH: [(11, SOUTH), (18, WEST)]
+}
+STRAIGHT_WEIGHT = 3
+TURN_WEIGHT = 1
+
+
+def _translate(road: Tuple, dx: float, dy: float) -> Tuple:
+    return tuple((x + dx, y + dy) for x, y in road)
+
+
+def grid_roads(n_rows: int, n_cols: int) -> Tuple[List[Tuple], List[List[int]]]:
+    """
+    Returns the roads of an n_rows x n_cols grid of two-way junctions, and the road indexes of every
+    junction, indexed by row * n_cols + col and by the local road index in
+    two_way_intersection.CURVED_ROADS. Roads shared by adjacent junctions are added once. A 1x1 grid is
+    the two-way intersection with curved turns
+    """
+    roads: List[Tuple] = []
+    road_indexes: Dict[Tuple, int] = {}  # {(start, end): road index}
+    junctions: List[List[int]] = []
+    for row in range(n_rows):
+        for col in range(n_cols):
+            local: List[int] = []
+            for road in CURVED_ROADS:
+                road = _translate(road, col * SPACING, row * SPACING)
+                key = (road[0], road[-1])
+                if key not in road_indexes:
+                    road_indexes[key] = len(roads)
+                    roads.append(road)
+                local.append(road_indexes[key])
+            junctions.append(local)
+    return roads, junctions
+
+
+def grid_paths(n_rows: int, n_cols: int, junctions: List[List[int]], row: int, col: int) -> List[List]:
+    """
+    Returns the weighted paths of the vehicles entering the grid at the given junction: for every side
+    on the grid boundary, going straight across the grid, or turning right once, at any junction along
+    the way, and then going straight to the boundary
+    """
+    paths = []
+    for side in MOVES:
+        d_row, d_col = NEIGHBOURS[side]
+        if 0 <= row + d_row < n_rows and 0 <= col + d_col < n_cols:
+            continue
+        n_junctions = n_cols if side in (WEST, EAST) else n_rows
+        for turn in [None] + list(range(n_junctions)):
+            path = [junctions[row * n_cols + col][side]]
+            r, c, entry, i = row, col, side, 0
+            while 0 <= r < n_rows and 0 <= c < n_cols:
+                road, exit_side = MOVES[entry][i == turn]
+                junction = junctions[r * n_cols + c]
+                path += [junction[road], junction[4 + exit_side]]
+                d_row, d_col = NEIGHBOURS[exit_side]
+                r, c, entry, i = r + d_row, c + d_col, (exit_side + 2) % 4, i + 1
+            paths.append([STRAIGHT_WEIGHT if turn is None else TURN_WEIGHT, path])
+    return paths
+
+
+def grid_regions(n_rows: int, n_cols: int, n_regions: int) -> List[Set[int]]:
+    """
+    Splits the roads of a grid into regions of adjacent junctions, in row-major order, see
+    TrafficSimulator.sharded_simulation. A junction's region owns its inbound and inner roads, and
+    its outbound roads that leave the grid. A road between junctions is owned by the region of the
+    junction it leads to, whose traffic signal controls it
+    """
+    roads, junctions = grid_roads(n_rows, n_cols)
+    owners: Dict[int, int] = {}  # {road index: region}
+    for i, junction in enumerate(junctions):
+        for road in junction[:4] + junction[8:]:
+            owners[road] = i * n_regions // len(junctions)
+    for i, junction in enumerate(junctions):
+        for road in junction[4:8]:
+            owners.setdefault(road, i * n_regions // len(junctions))
+    regions: List[Set[int]] = [set() for _ in range(n_regions)]
+    for road, region in owners.items():
+        regions[region].add(road)
+    return regions
+
+
+def grid_setup(n_rows: int, n_cols: int, vehicle_rate=VEHICLE_RATE, max_gen=None, engine='object',
+               seed=None, tolerance=None):
+    """
+    Returns a simulation of an n_rows x n_cols grid of connected two-way junctions. Every junction
+    has its own traffic signal and intersections, and every junction on the grid boundary has its own
+    generator of vehicles, crossing several junctions. A junction generates vehicle_rate vehicles per
+    minute over its 4 sides, that is, every inbound road on the boundary gets a quarter of the rate.
+    The traffic signals switch together
+    """
+    sim = Simulation(max_gen, engine, seed=seed, tolerance=tolerance)
+    roads, junctions = grid_roads(n_rows, n_cols)
+    sim.add_roads(roads)
+    for row in range(n_rows):
+        for col in range(n_cols):
+            paths = grid_paths(n_rows, n_cols, junctions, row, col)
+            if paths:
+                n_sides = len({path[0] for weight, path in paths})
+                sim.add_generator(vehicle_rate * n_sides / 4, paths)
+    for junction in junctions:
+        signal_roads = [[junction[i] for i in group] for group in SIGNAL_ROADS]
+        sim.add_traffic_signal(signal_roads, CYCLE, SLOW_DISTANCE, SLOW_FACTOR, STOP_DISTANCE)
+        sim.add_intersections({junction[road]: {junction[i] for i in intersecting_roads}
+                               for road, intersecting_roads in CURVED_INTERSECTIONS_DICT.items()})
+    return sim
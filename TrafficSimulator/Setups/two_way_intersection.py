@@ -1,5 +1,5 @@
 from TrafficSimulator import Simulation
-from TrafficSimulator.curve import turn_road, TURN_RIGHT, TURN_LEFT
+from TrafficSimulator.curve import turn_points, TURN_RIGHT, TURN_LEFT
 
 n = 15  # Curve resolution
 a = 2  # Short offset from (0, 0)
@@ -48,19 +48,34 @@ SOUTH_STRAIGHT = (SOUTH_RIGHT, NORTH_LEFT)
 EAST_STRAIGHT = (EAST_RIGHT, WEST_LEFT)
 NORTH_STRAIGHT = (NORTH_RIGHT, SOUTH_LEFT)
 
-WEST_RIGHT_TURN = turn_road(WEST_RIGHT, SOUTH_LEFT, TURN_RIGHT, n)
-WEST_LEFT_TURN = turn_road(WEST_RIGHT, NORTH_LEFT, TURN_LEFT, n)
+# Turns, as polylines of n + 1 points
+WEST_RIGHT_TURN = turn_points(WEST_RIGHT, SOUTH_LEFT, TURN_RIGHT, n)
+WEST_LEFT_TURN = turn_points(WEST_RIGHT, NORTH_LEFT, TURN_LEFT, n)
 
-SOUTH_RIGHT_TURN = turn_road(SOUTH_RIGHT, EAST_LEFT, TURN_RIGHT, n)
-SOUTH_LEFT_TURN = turn_road(SOUTH_RIGHT, WEST_LEFT, TURN_LEFT, n)
+SOUTH_RIGHT_TURN = turn_points(SOUTH_RIGHT, EAST_LEFT, TURN_RIGHT, n)
+SOUTH_LEFT_TURN = turn_points(SOUTH_RIGHT, WEST_LEFT, TURN_LEFT, n)
 
-EAST_RIGHT_TURN = turn_road(EAST_RIGHT, NORTH_LEFT, TURN_RIGHT, n)
-EAST_LEFT_TURN = turn_road(EAST_RIGHT, SOUTH_LEFT, TURN_LEFT, n)
+EAST_RIGHT_TURN = turn_points(EAST_RIGHT, NORTH_LEFT, TURN_RIGHT, n)
+EAST_LEFT_TURN = turn_points(EAST_RIGHT, SOUTH_LEFT, TURN_LEFT, n)
 
-NORTH_RIGHT_TURN = turn_road(NORTH_RIGHT, WEST_LEFT, TURN_RIGHT, n)
-NORTH_LEFT_TURN = turn_road(NORTH_RIGHT, EAST_LEFT, TURN_LEFT, n)
+NORTH_RIGHT_TURN = turn_points(NORTH_RIGHT, WEST_LEFT, TURN_RIGHT, n)
+NORTH_LEFT_TURN = turn_points(NORTH_RIGHT, EAST_LEFT, TURN_LEFT, n)
 
-ROADS = [
+TURNS = [
+    WEST_RIGHT_TURN,
+    WEST_LEFT_TURN,
+
+    SOUTH_RIGHT_TURN,
+    SOUTH_LEFT_TURN,
+
+    EAST_RIGHT_TURN,
+    EAST_LEFT_TURN,
+
+    NORTH_RIGHT_TURN,
+    NORTH_LEFT_TURN
+]
+
+STRAIGHT_ROADS = [
     WEST_INBOUND,  # 0
     SOUTH_INBOUND,  # 1
     EAST_INBOUND,  # 2
@@ -74,19 +89,13 @@ ROADS = [
     WEST_STRAIGHT,  # 8
     SOUTH_STRAIGHT,  # 9
     EAST_STRAIGHT,  # 10
-    NORTH_STRAIGHT,  # 11
-
-    *WEST_RIGHT_TURN,
-    *WEST_LEFT_TURN,
-
-    *SOUTH_RIGHT_TURN,
-    *SOUTH_LEFT_TURN,
-
-    *EAST_RIGHT_TURN,
-    *EAST_LEFT_TURN,
+    NORTH_STRAIGHT  # 11
+]
 
-    *NORTH_RIGHT_TURN,
-    *NORTH_LEFT_TURN
+# The default geometry, which the shipped Q-table was trained on: every turn is n straight roads, from 12 on
+ROADS = [
+    *STRAIGHT_ROADS,
+    *[(points[i - 1], points[i]) for points in TURNS for i in range(1, len(points))]
 ]
 
 
@@ -146,6 +155,52 @@ INTERSECTIONS_DICT = {
     **d9
 }
 
+# With curved_turns, every turn is a single curved road, from 12 on
+CURVED_ROADS = [
+    *STRAIGHT_ROADS,
+    *TURNS
+]
+
+# {FROM} {TURN DIRECTION} {TO}
+c12 = 12  # W_R_S
+c13 = 13  # W_L_N
+c14 = 14  # S_R_E
+c15 = 15  # S_L_W
+c16 = 16  # E_R_N
+c17 = 17  # E_L_S
+c18 = 18  # N_R_W
+c19 = 19  # N_L_E
+
+CURVED_PATHS = [
+    [3, [0, 8, 6]],  # WEST STRAIGHT EAST
+    [1, [0, c12, 5]],  # WEST RIGHT SOUTH
+    # [1, [0, c13, 7]],  # WEST LEFT NORTH
+
+    [3, [1, 9, 7]],  # SOUTH STRAIGHT NORTH
+    [1, [1, c14, 6]],  # SOUTH RIGHT EAST
+    # [1, [1, c15, 4]],  # SOUTH LEFT WEST
+
+    [3, [2, 10, 4]],  # EAST STRAIGHT WEST
+    [1, [2, c16, 7]],  # EAST RIGHT NORTH
+    # [1, [2, c17, 5]],  # EAST LEFT SOUTH
+
+    [3, [3, 11, 5]],  # NORTH STRAIGHT SOUTH
+    [1, [3, c18, 4]],  # NORTH RIGHT WEST
+    # [1, [3, c19, 6]]  # NORTH LEFT EAST
+]
+
+CURVED_INTERSECTIONS_DICT = {
+    8: {9, 11, c14, c15, c17, c19},
+    9: {10, c12, c13, c16, c17, c19},
+    10: {11, c13, c15, c18, c19},
+    11: {c12, c13, c15, c17},
+    c12: {c17},
+    c13: {c15, c16, c19},
+    c14: {c19},
+    c15: {c17, c18},
+    c17: {c19}
+}
+
 # Signals
 SIGNAL_ROADS = [[0, 2], [1, 3]]  # WEST, EAST, SOUTH NORTH
 CYCLE = [(False, True), (False, False), (True, False), (False, False)]
@@ -154,10 +209,11 @@ SLOW_FACTOR = 0.4
 STOP_DISTANCE = 15
 
 
-def two_way_intersection_setup(max_gen=None):
-    sim = Simulation(max_gen)
-    sim.add_roads(ROADS)
-    sim.add_generator(VEHICLE_RATE, PATHS)
+def two_way_intersection_setup(max_gen=None, engine='object', seed=None, arrivals=None, tolerance=None,
+                               curved_turns=False):
+    sim = Simulation(max_gen, engine, seed=seed, tolerance=tolerance)
+    sim.add_roads(CURVED_ROADS if curved_turns else ROADS)
+    sim.add_generator(VEHICLE_RATE, CURVED_PATHS if curved_turns else PATHS, arrivals)
     sim.add_traffic_signal(SIGNAL_ROADS, CYCLE, SLOW_DISTANCE, SLOW_FACTOR, STOP_DISTANCE)
-    sim.add_intersections(INTERSECTIONS_DICT)
+    sim.add_intersections(CURVED_INTERSECTIONS_DICT if curved_turns else INTERSECTIONS_DICT)
     return sim
@@ -1 +1,2 @@
-from .simulation import Simulation
+from .render_policy import RenderPolicy
+from .simulation import Simulation, run_lockstep
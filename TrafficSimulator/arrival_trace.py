@@ -0,0 +1,37 @@
+from typing import List, Optional, Union
+
+import numpy as np
+from numpy.random import SeedSequence
+
+# An arrival record: the arrival time, in simulation seconds, and the index of the path in the generator paths
+ARRIVAL_DTYPE = np.dtype([('t', '<f8'), ('path', '<u2')])
+
+
+def generate_arrivals(vehicle_rate: int, paths: List[List], n_vehicles: int,
+                      n_episodes: Optional[int] = None,
+                      seed: Union[None, int, SeedSequence, np.random.Generator] = None) -> np.ndarray:
+    """
+    Returns the arrival trace of a generator: n_vehicles records, one every 60 / vehicle_rate seconds
+    starting at 0, with paths drawn by their weights. With n_episodes, returns a demand set of shape
+    (n_episodes, n_vehicles), a trace per row
+    """
+    rng = np.random.default_rng(seed)
+    shape = (n_vehicles,) if n_episodes is None else (n_episodes, n_vehicles)
+    weights = np.array([weight for weight, path in paths], dtype=float)
+    arrivals = np.empty(shape, dtype=ARRIVAL_DTYPE)
+    arrivals['t'] = np.arange(n_vehicles) * (60 / vehicle_rate)
+    arrivals['path'] = rng.choice(len(paths), size=shape, p=weights / weights.sum())
+    return arrivals
+
+
+def save_arrivals(file, arrivals: np.ndarray) -> None:
+    """ Saves an arrival trace or a demand set as a .npy file """
+    np.save(file, np.ascontiguousarray(arrivals, dtype=ARRIVAL_DTYPE))
+
+
+def load_arrivals(file, mmap: bool = True) -> np.ndarray:
+    """ Loads an arrival trace or a demand set, memory-mapped and read-only by default """
+    arrivals = np.load(file, mmap_mode='r' if mmap else None)
+    if arrivals.dtype != ARRIVAL_DTYPE:
+        raise ValueError(f'Expected arrival records of dtype {ARRIVAL_DTYPE}, got {arrivals.dtype}')
+    return arrivals
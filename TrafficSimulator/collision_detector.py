@@ -0,0 +1,288 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from math import inf, sqrt
+from time import perf_counter
+from typing import Dict, List, Optional, Set, Tuple, Type
+
+from TrafficSimulator.road import Road
+
+
+class ActiveConflicts:
+    """
+    Index of the active conflicts: the pairs of intersecting roads which are both non-empty. It's updated
+    only when a road changes between empty and non-empty, and read by the collision detectors every tick
+    """
+
+    def __init__(self):
+        self._conflicts: Dict[int, Set[int]] = {}  # {Road index: {intersecting roads' indexes}}, symmetric
+        self.pairs: Set[Tuple[int, int]] = set()  # (smaller road index, larger road index)
+        self.roads: Dict[int, int] = {}  # {Road index: number of active pairs}, for roads with active pairs
+
+    def add_intersections(self, intersections_dict: Dict[int, Set[int]], non_empty_roads: Set[int]) -> None:
+        for road, intersecting_roads in intersections_dict.items():
+            self._conflicts.setdefault(road, set()).update(intersecting_roads)
+            for intersecting_road in intersecting_roads:
+                self._conflicts.setdefault(intersecting_road, set()).add(road)
+        self.reset(non_empty_roads)
+
+    def copy(self) -> 'ActiveConflicts':
+        """ Returns an index of the same intersections and active conflicts """
+        active_conflicts = ActiveConflicts()
+        active_conflicts._conflicts = self._conflicts
+        active_conflicts.pairs = set(self.pairs)
+        active_conflicts.roads = dict(self.roads)
+        return active_conflicts
+
+    def reset(self, non_empty_roads: Set[int]) -> None:
+        """ Rebuilds the index from the set of non-empty roads """
+        self.pairs = set()
+        self.roads = {}
+        for road in non_empty_roads:
+            self.occupy(road, non_empty_roads)
+
+    def occupy(self, road: int, non_empty_roads: Set[int]) -> None:
+        """ Activates the conflicts of a road that became non-empty, given the updated non-empty roads """
+        for other_road in self._conflicts.get(road, ()):
+            if other_road in non_empty_roads:
+                pair = (road, other_road) if road < other_road else (other_road, road)
+                if pair not in self.pairs:
+                    self.pairs.add(pair)
+                    self.roads[road] = self.roads.get(road, 0) + 1
+                    self.roads[other_road] = self.roads.get(other_road, 0) + 1
+
+    def vacate(self, road: int) -> None:
+        """ Deactivates the conflicts of a road that became empty """
+        for other_road in self._conflicts.get(road, ()):
+            pair = (road, other_road) if road < other_road else (other_road, road)
+            if pair in self.pairs:
+                self.pairs.remove(pair)
+                for i in pair:
+                    self.roads[i] -= 1
+                    if not self.roads[i]:
+                        del self.roads[i]
+
+
+class CollisionDetector(ABC):
+    """ Detects collisions between vehicles on intersecting roads, and keeps the collision checks stats """
+
+    def __init__(self, radius: float = 3):
+        self.radius: float = radius
+        self._conflicts: Dict[int, Set[int]] = {}  # {Road index: {intersecting roads' indexes}}, symmetric
+
+        # Stats
+        self.n_ticks: int = 0  # Number of collision checks
+        self.n_collisions: int = 0  # Number of colliding vehicle pairs
+        self.check_time: float = 0  # Total check time, in seconds
+        self.max_check_time: float = 0  # Longest single check time, in seconds
+
+    def add_intersections(self, intersections_dict: Dict[int, Set[int]], roads: List[Road]) -> None:
+        for road, intersecting_roads in intersections_dict.items():
+            self._conflicts.setdefault(road, set()).update(intersecting_roads)
+            for intersecting_road in intersecting_roads:
+                self._conflicts.setdefault(intersecting_road, set()).add(road)
+
+    @property
+    def mean_check_time(self) -> float:
+        """ Returns the average check time per tick, in seconds """
+        return self.check_time / self.n_ticks if self.n_ticks else 0
+
+    def detect(self, roads: List[Road], active_conflicts: ActiveConflicts) -> int:
+        """ Returns the number of colliding pairs of vehicles on intersecting roads """
+        start = perf_counter()
+        n_collisions = self._count_collisions(roads, active_conflicts) if active_conflicts.pairs else 0
+        check_time = perf_counter() - start
+        self.n_ticks += 1
+        self.n_collisions += n_collisions
+        self.check_time += check_time
+        self.max_check_time = max(self.max_check_time, check_time)
+        return n_collisions
+
+    @abstractmethod
+    def _count_collisions(self, roads: List[Road], active_conflicts: ActiveConflicts) -> int:
+        """ Returns the number of colliding pairs of vehicles on the roads of the active conflicts """
+
+
+class SpatialHash(CollisionDetector):
+    """
+    Uses a uniform grid with cells the size of the collision radius. Vehicles on junction roads
+    are bucketed by cell, and every vehicle is checked only against the vehicles of its neighbouring
+    cells which drive on intersecting roads, at O(vehicles) per tick
+    """
+
+    def _count_collisions(self, roads: List[Road], active_conflicts: ActiveConflicts) -> int:
+        n_collisions = 0
+        size = self.radius
+        squared_radius = self.radius * self.radius
+        cells: Dict[Tuple[int, int], List[Tuple[float, float, int]]] = {}
+        # Only the roads with non-empty intersecting roads
+        for i in active_conflicts.roads:
+            conflicts = self._conflicts[i]
+            for vehicle in roads[i].vehicles:
+                x, y = vehicle.position
+                cell_x, cell_y = int(x // size), int(y // size)
+                # Check the vehicles that were already added to the neighbouring cells
+                for neighbour_x in (cell_x - 1, cell_x, cell_x + 1):
+                    for neighbour_y in (cell_y - 1, cell_y, cell_y + 1):
+                        for other_x, other_y, road in cells.get((neighbour_x, neighbour_y), ()):
+                            if road in conflicts and \
+                                    (x - other_x) ** 2 + (y - other_y) ** 2 < squared_radius:
+                                n_collisions += 1
+                cells.setdefault((cell_x, cell_y), []).append((x, y, i))
+        return n_collisions
+
+
+def _line_disk_interval(p: Tuple, u: Tuple, center: Tuple, radius: float) -> Optional[Tuple[float, float]]:
+    """ Returns the interval of s for which p + u * s is inside the disk, or None """
+    dx, dy = p[0] - center[0], p[1] - center[1]
+    b = u[0] * dx + u[1] * dy
+    discriminant = b * b - (dx * dx + dy * dy - radius * radius)
+    if discriminant <= 0:
+        return None
+    root = sqrt(discriminant)
+    return -b - root, -b + root
+
+
+def _linear_interval(c0: float, c1: float, low: float, high: float) -> Optional[Tuple[float, float]]:
+    """ Returns the interval of s for which low < c0 + c1 * s < high, or None """
+    if abs(c1) < 1e-12:
+        return (-inf, inf) if low < c0 < high else None
+    s1, s2 = (low - c0) / c1, (high - c0) / c1
+    return min(s1, s2), max(s1, s2)
+
+
+def _segment_interval(start: Tuple, end: Tuple, other_start: Tuple, other_end: Tuple,
+                      radius: float) -> Optional[Tuple[float, float]]:
+    """ Returns the arc-length interval on the segment in which a point is closer than radius
+    to the other segment, or None. This is the intersection of the segment and the capsule around
+    the other segment, which is the union of two disks and a rectangle """
+    length = sqrt((end[0] - start[0]) ** 2 + (end[1] - start[1]) ** 2)
+    other_length = sqrt((other_end[0] - other_start[0]) ** 2 + (other_end[1] - other_start[1]) ** 2)
+    u = ((end[0] - start[0]) / length, (end[1] - start[1]) / length)
+    w = ((other_end[0] - other_start[0]) / other_length, (other_end[1] - other_start[1]) / other_length)
+    intervals = [_line_disk_interval(start, u, other_start, radius),
+                 _line_disk_interval(start, u, other_end, radius)]
+    # Rectangle: the projection on the other segment is within it, and the normal distance is below radius
+    dx, dy = start[0] - other_start[0], start[1] - other_start[1]
+    along = _linear_interval(dx * w[0] + dy * w[1], u[0] * w[0] + u[1] * w[1], 0, other_length)
+    normal = _linear_interval(dx * w[1] - dy * w[0], u[0] * w[1] - u[1] * w[0], -radius, radius)
+    if along and normal and max(along[0], normal[0]) < min(along[1], normal[1]):
+        intervals.append((max(along[0], normal[0]), min(along[1], normal[1])))
+    intervals = [interval for interval in intervals if interval]
+    if not intervals:
+        return None
+    low, high = max(0.0, min(i[0] for i in intervals)), min(length, max(i[1] for i in intervals))
+    if low >= high:
+        return None
+    return low, high
+
+
+@lru_cache(maxsize=None)
+def conflict_entry(start: Tuple, end: Tuple, other_start: Tuple, other_end: Tuple,
+                   radius: float) -> Optional[Tuple]:
+    """
+    Returns the conflict entry of two straight segments, or None if no point of one segment is within
+    radius of the other. The entry holds the arc-length interval on each segment in which the segments
+    are closer than radius, and the coefficients of the squared distance between the points x on
+    the first segment and y on the second segment: c0 + c1 * x + c2 * y + c3 * x * y + x ** 2 + y ** 2
+    """
+    interval = _segment_interval(start, end, other_start, other_end, radius)
+    other_interval = _segment_interval(other_start, other_end, start, end, radius)
+    if not (interval and other_interval):
+        return None
+    length = sqrt((end[0] - start[0]) ** 2 + (end[1] - start[1]) ** 2)
+    other_length = sqrt((other_end[0] - other_start[0]) ** 2 + (other_end[1] - other_start[1]) ** 2)
+    ux, uy = (end[0] - start[0]) / length, (end[1] - start[1]) / length
+    wx, wy = (other_end[0] - other_start[0]) / other_length, (other_end[1] - other_start[1]) / other_length
+    dx, dy = start[0] - other_start[0], start[1] - other_start[1]
+    margin = 1e-6  # Keeps the intervals inclusive of the points found by the exact test
+    return (interval[0] - margin, interval[1] + margin, other_interval[0] - margin, other_interval[1] + margin,
+            dx * dx + dy * dy, 2 * (ux * dx + uy * dy), -2 * (wx * dx + wy * dy), -2 * (ux * wx + uy * wy))
+
+
+class ConflictTable(CollisionDetector):
+    """
+    Precomputes, for every pair of intersecting roads, the arc-length intervals on both roads in which
+    they are closer than the collision radius. Collision checks are then 1-D tests on the vehicles'
+    positions relative to their roads, and only run while vehicles are inside conflict intervals
+    """
+
+    def __init__(self, radius: float = 3):
+        super().__init__(radius)
+        # {Road index: {intersecting road index: [conflict entries]}}, each pair is stored under its
+        # smaller index. Every pair of conflicting road pieces has an entry, see _road_entries()
+        self._table: Dict[int, Dict[int, List[Tuple]]] = {}
+        # {Road index: (start, end)} of the union of the road's conflict intervals
+        self._zones: Dict[int, Tuple[float, float]] = {}
+
+    def add_intersections(self, intersections_dict: Dict[int, Set[int]], roads: List[Road]) -> None:
+        super().add_intersections(intersections_dict, roads)
+        for road, intersecting_roads in intersections_dict.items():
+            for intersecting_road in intersecting_roads:
+                i, j = min(road, intersecting_road), max(road, intersecting_road)
+                entries = self._road_entries(roads[i], roads[j])
+                if not entries:
+                    continue
+                self._table.setdefault(i, {})[j] = entries
+                for entry in entries:
+                    self._add_zone(i, entry[0], entry[1])
+                    self._add_zone(j, entry[2], entry[3])
+
+    def _road_entries(self, road: Road, other_road: Road) -> List[Tuple]:
+        """ Returns the conflict entries of every pair of conflicting pieces of the roads. An entry holds
+        the arc-length intervals on both roads, the arc-length offsets of both pieces and the
+        coefficients of the squared distance, see conflict_entry() """
+        entries = []
+        for offset, length, start, cos, sin in road.pieces:
+            end = (start[0] + cos * length, start[1] + sin * length)
+            for other_offset, other_length, other_start, other_cos, other_sin in other_road.pieces:
+                other_end = (other_start[0] + other_cos * other_length, other_start[1] + other_sin * other_length)
+                entry = conflict_entry(start, end, other_start, other_end, self.radius)
+                if entry is not None:
+                    start_x, end_x, other_start_x, other_end_x, *coefficients = entry
+                    entries.append((offset + start_x, offset + end_x, other_offset + other_start_x,
+                                    other_offset + other_end_x, offset, other_offset, *coefficients))
+        return entries
+
+    def _add_zone(self, road: int, start: float, end: float) -> None:
+        zone_start, zone_end = self._zones.get(road, (start, end))
+        self._zones[road] = min(zone_start, start), max(zone_end, end)
+
+    def _count_collisions(self, roads: List[Road], active_conflicts: ActiveConflicts) -> int:
+        # Positions of the vehicles inside conflict zones, by road
+        occupied: Dict[int, List[float]] = {}
+        for i in active_conflicts.roads:
+            zone = self._zones.get(i)
+            if zone:
+                start, end = zone
+                positions = [x for x in (vehicle.x for vehicle in roads[i].vehicles) if start < x < end]
+                if positions:
+                    occupied[i] = positions
+        if len(occupied) < 2:
+            return 0
+
+        n_collisions = 0
+        squared_radius = self.radius * self.radius
+        for i, j in active_conflicts.pairs:
+            if i not in occupied or j not in occupied:
+                continue
+            entries = self._table.get(i, {}).get(j)
+            if not entries:
+                continue
+            for x in occupied[i]:
+                for y in occupied[j]:
+                    n_collisions += self._pair_collides(entries, x, y, squared_radius)
+        return n_collisions
+
+    @staticmethod
+    def _pair_collides(entries: List[Tuple], x: float, y: float, squared_radius: float) -> bool:
+        for start, end, other_start, other_end, offset, other_offset, c0, c1, c2, c3 in entries:
+            if start < x < end and other_start < y < other_end:
+                x_piece, y_piece = x - offset, y - other_offset
+                if c0 + c1 * x_piece + c2 * y_piece + c3 * x_piece * y_piece + \
+                        x_piece * x_piece + y_piece * y_piece < squared_radius:
+                    return True
+        return False
+
+
+COLLISION_DETECTORS: Dict[str, Type[CollisionDetector]] = {'spatial_hash': SpatialHash,
+                                                           'conflict_table': ConflictTable}
@@ -24,7 +24,7 @@ TURN_LEFT = 0
 TURN_RIGHT = 1
 
 
-def turn_road(start, end, turn_direction, resolution=15):
+def turn_points(start, end, turn_direction, resolution=15):
     # Get control point
     x = min(start[0], end[0])
     y = min(start[1], end[1])
@@ -36,4 +36,9 @@ def turn_road(start, end, turn_direction, resolution=15):
         control = (x - y + end[1],
                    y - x + start[0])
 
-    return curve_road(start, end, control, resolution=resolution)
+    return curve_points(start, end, control, resolution=resolution)
+
+
+def turn_road(start, end, turn_direction, resolution=15):
+    points = turn_points(start, end, turn_direction, resolution=resolution)
+    return [(points[i - 1], points[i]) for i in range(1, len(points))]
@@ -0,0 +1,472 @@
+import warnings
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+from TrafficSimulator.idm_kernel import compiled_idm_step
+from TrafficSimulator.road import Road
+from TrafficSimulator.vehicle import Vehicle
+
+
+class ObjectEngine:
+    """ Updates the vehicles one by one, using Road.update and Vehicle.update """
+    name = 'object'
+
+    def __init__(self):
+        self._pool: List[Vehicle] = []  # Vehicles that left the map, reused by create_vehicle
+
+    def attach(self, roads: List[Road]) -> int:
+        """ Registers the roads of a simulation, returns the simulation lane """
+        return 0
+
+    def detach(self, lane: int) -> None:
+        """ Releases a simulation lane """
+
+    def create_vehicle(self, path: List[int], lane: int = 0) -> Vehicle:
+        if self._pool:
+            vehicle = self._pool.pop()
+            vehicle.reset(path)
+            return vehicle
+        return Vehicle(path)
+
+    def update(self, sims: List) -> None:
+        """ Updates the vehicles of the given simulations """
+        for sim in sims:
+            for i in sim.non_empty_roads:
+                road = sim.roads[i]
+                # Only the lead vehicle of a road may stop or resume
+                lead = road.vehicles[0]
+                was_stopped, stop_time = lead.is_stopped, lead._last_time_stopped
+                road.update(sim.dt, sim.t)
+                if lead.is_stopped != was_stopped:
+                    if was_stopped:
+                        sim.count_stops(-1, -stop_time, sim.t - stop_time)
+                    else:
+                        sim.count_stops(1, sim.t, 0)
+
+    def on_enter(self, vehicle: Vehicle, road: Road) -> None:
+        """ Called after a vehicle was appended to a road """
+
+    def on_leave(self, vehicle: Vehicle, road: Road) -> None:
+        """ Called after the lead vehicle of a road was removed from it """
+
+    def on_exit(self, vehicle: Vehicle) -> None:
+        """ Called after a vehicle completed its journey and left the map. The vehicle is reused """
+        self._pool.append(vehicle)
+
+
+class ArrayVehicle(Vehicle):
+    """ A vehicle whose dynamic state is stored in the arrays of a NumpyEngine """
+    __slots__ = ('_engine', '_lane', '_slot')
+
+    def __init__(self, path: List[int], engine: 'NumpyEngine', lane: int = 0):
+        self._engine = engine
+        self._lane: int = lane
+        self._slot: int = engine.allocate()
+        super().__init__(path)
+        engine.bind(self)
+
+    @property
+    def index(self) -> int:
+        return int(self._engine.index[self._slot])
+
+    @index.setter
+    def index(self, value: int) -> None:
+        self._engine.index[self._slot] = value
+
+    @property
+    def x(self) -> float:
+        return float(self._engine.x[self._slot])
+
+    @x.setter
+    def x(self, value: float) -> None:
+        self._engine.x[self._slot] = value
+
+    @property
+    def v(self) -> float:
+        return float(self._engine.v[self._slot])
+
+    @v.setter
+    def v(self, value: float) -> None:
+        self._engine.v[self._slot] = value
+
+    @property
+    def a(self) -> float:
+        return float(self._engine.a[self._slot])
+
+    @a.setter
+    def a(self, value: float) -> None:
+        self._engine.a[self._slot] = value
+
+    @property
+    def v_max(self) -> float:
+        return float(self._engine.v_max[self._slot])
+
+    @v_max.setter
+    def v_max(self, value: float) -> None:
+        self._engine.v_max[self._slot] = value
+
+    @property
+    def is_stopped(self) -> bool:
+        return bool(self._engine.stopped[self._slot])
+
+    @is_stopped.setter
+    def is_stopped(self, value: bool) -> None:
+        self._engine.stopped[self._slot] = value
+
+    @property
+    def _last_time_stopped(self) -> Optional[float]:
+        value = self._engine.last_time_stopped[self._slot]
+        return None if np.isnan(value) else float(value)
+
+    @_last_time_stopped.setter
+    def _last_time_stopped(self, value: Optional[float]) -> None:
+        self._engine.last_time_stopped[self._slot] = np.nan if value is None else value
+
+    @property
+    def _waiting_time(self) -> float:
+        return float(self._engine.waiting_time[self._slot])
+
+    @_waiting_time.setter
+    def _waiting_time(self, value: float) -> None:
+        self._engine.waiting_time[self._slot] = value
+
+    @property
+    def position(self) -> Tuple:
+        slot = self._slot
+        return float(self._engine.position_x[slot]), float(self._engine.position_y[slot])
+
+    @position.setter
+    def position(self, value: Tuple) -> None:
+        x, y = value
+        self._engine.position_x[self._slot] = np.nan if x is None else x
+        self._engine.position_y[self._slot] = np.nan if y is None else y
+
+
+class NumpyEngine:
+    """
+    Structure-of-arrays engine: the kinematic state of every vehicle is stored in contiguous
+    arrays, and the traffic signal logic of Road.update and the IDM update of Vehicle.update
+    run as a single vectorized pass per tick. Produces the same trajectories as ObjectEngine.
+    Several simulations (lanes) can share an engine, see simulation.run_lockstep
+    """
+    name = 'numpy'
+    _float_fields = ('x', 'v', 'a', 'v_max', '_v_max', 'length', 's0', 'T', 'a_max', 'b_max', 'sqrt_ab',
+                     'last_time_stopped', 'waiting_time', 'position_x', 'position_y')
+    _int_fields = ('lead', 'road', 'lane', 'index')
+    _bool_fields = ('stopped', 'active')
+
+    def __init__(self, capacity: int = 64):
+        self._capacity: int = 0
+        self._free_slots: List[int] = []
+        self._pending_slot: Optional[int] = None
+        self._pool: List[ArrayVehicle] = []  # Vehicles that left the map, reused by create_vehicle
+        self._slots: np.ndarray = np.empty(0, dtype=np.intp)  # Active slots
+        self._slots_dirty: bool = False
+
+        # The roads list of every attached simulation, indexed by lane
+        self._lanes: List[Optional[List[Road]]] = []
+
+        # Road tables, indexed by the lane road offset + the road index
+        self._n_roads: int = 0
+        self._tables_dirty: bool = True
+        self._lane_road_offset: np.ndarray = np.empty(0, dtype=np.intp)
+        # Road pieces (see Road.pieces) of all the roads, sorted by road and arc length offset.
+        # A piece of a road is found by searching the road key + the arc length in the piece keys
+        self._curved: bool = False  # Whether any road has more than one piece
+        self._road_key: np.ndarray = np.empty(0)
+        self._piece_key: np.ndarray = np.empty(0)
+        self._piece_offset: np.ndarray = np.empty(0)
+        self._piece_start_x: np.ndarray = np.empty(0)
+        self._piece_start_y: np.ndarray = np.empty(0)
+        self._piece_cos: np.ndarray = np.empty(0)
+        self._piece_sin: np.ndarray = np.empty(0)
+        self._road_length: np.ndarray = np.empty(0)
+        self._road_stop_distance: np.ndarray = np.empty(0)
+        self._road_slow_factor: np.ndarray = np.empty(0)
+        self._road_green: np.ndarray = np.empty(0, dtype=bool)
+        self._signal_roads: np.ndarray = np.empty(0, dtype=np.intp)
+        self._signal_groups: List[Tuple] = []  # [(traffic signal, group)] matching self._signal_roads
+
+        for name in self._float_fields:
+            setattr(self, name, np.empty(0))
+        for name in self._int_fields:
+            setattr(self, name, np.empty(0, dtype=np.intp))
+        for name in self._bool_fields:
+            setattr(self, name, np.empty(0, dtype=bool))
+        self._grow(capacity)
+
+    def _grow(self, capacity: int) -> None:
+        """ Resizes the vehicle arrays to the given capacity """
+        for name in self._float_fields + self._int_fields + self._bool_fields:
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self._capacity] = array
+            setattr(self, name, grown)
+        self._free_slots.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+
+    def attach(self, roads: List[Road]) -> int:
+        """ Registers the roads of a simulation, returns the simulation lane """
+        self._tables_dirty = True
+        if None in self._lanes:
+            lane = self._lanes.index(None)
+            self._lanes[lane] = roads
+            return lane
+        self._lanes.append(roads)
+        return len(self._lanes) - 1
+
+    def detach(self, lane: int) -> None:
+        """ Releases a simulation lane and the slots of its vehicles """
+        slots = np.flatnonzero(self.active & (self.lane == lane))
+        self.active[slots] = False
+        self._free_slots.extend(slots.tolist())
+        self._slots_dirty = True
+        self._lanes[lane] = None
+        self._tables_dirty = True
+
+    def active_slots(self, lane: Optional[int] = None) -> np.ndarray:
+        """ Returns the slots of the vehicles on the map, of every lane or of the given lane """
+        if self._slots_dirty:
+            self._slots = np.flatnonzero(self.active)
+            self._slots_dirty = False
+        if lane is None or len(self._lanes) == 1:
+            return self._slots
+        return self._slots[self.lane[self._slots] == lane]
+
+    def allocate(self) -> int:
+        """ Returns a free vehicle slot. The slot of a vehicle that was created but never placed
+        on a road (the generator drops vehicles that don't fit) is reused """
+        if self._pending_slot is not None and not self.active[self._pending_slot]:
+            return self._pending_slot
+        if not self._free_slots:
+            self._grow(2 * self._capacity)
+        self._pending_slot = self._free_slots.pop()
+        return self._pending_slot
+
+    def bind(self, vehicle: ArrayVehicle) -> None:
+        """ Copies the constant vehicle parameters into the vehicle's slot """
+        slot, params = vehicle._slot, vehicle.params
+        self._v_max[slot] = params.v_max
+        self.length[slot] = params.length
+        self.s0[slot] = params.s0
+        self.T[slot] = params.T
+        self.a_max[slot] = params.a_max
+        self.b_max[slot] = params.b_max
+        self.sqrt_ab[slot] = params.sqrt_ab
+        self.lane[slot] = vehicle._lane
+        self.lead[slot] = -1
+
+    def create_vehicle(self, path: List[int], lane: int = 0) -> Vehicle:
+        if self._pool:
+            vehicle = self._pool.pop()
+            vehicle._lane = lane
+            vehicle._slot = self.allocate()
+            vehicle.reset(path)
+            self.bind(vehicle)
+            return vehicle
+        return ArrayVehicle(path, self, lane)
+
+    def on_enter(self, vehicle: ArrayVehicle, road: Road) -> None:
+        slot = vehicle._slot
+        if not self.active[slot]:
+            self.active[slot] = True
+            self._slots_dirty = True
+            if slot == self._pending_slot:
+                # Placed, so it returns to the free slots once the vehicle exits
+                self._pending_slot = None
+        self.road[slot] = road.index
+        self.lead[slot] = road.vehicles[-2]._slot if len(road.vehicles) > 1 else -1
+
+    def on_leave(self, vehicle: ArrayVehicle, road: Road) -> None:
+        if road.vehicles:
+            self.lead[road.vehicles[0]._slot] = -1
+
+    def on_exit(self, vehicle: ArrayVehicle) -> None:
+        slot = vehicle._slot
+        self.active[slot] = False
+        self._free_slots.append(slot)
+        self._slots_dirty = True
+        self._pool.append(vehicle)
+
+    def _build_road_tables(self) -> None:
+        """ Stores the road geometry and traffic signal parameters of every lane in arrays """
+        roads: List[Road] = []
+        offsets: List[int] = []
+        for lane_roads in self._lanes:
+            offsets.append(len(roads))
+            roads.extend(lane_roads or [])
+        self._n_roads = len(roads)
+        self._lane_road_offset = np.array(offsets, dtype=np.intp)
+        self._road_length = np.array([road.length for road in roads], dtype=float)
+        # Keys of consecutive roads are spaced by more than the road length
+        self._road_key = np.concatenate(([0], np.cumsum(self._road_length + 1)[:-1]))
+        pieces = [(key + offset, offset, start, cos, sin)
+                  for road, key in zip(roads, self._road_key) for offset, length, start, cos, sin in road.pieces]
+        self._curved = len(pieces) > len(roads)
+        self._piece_key = np.array([piece[0] for piece in pieces], dtype=float)
+        self._piece_offset = np.array([piece[1] for piece in pieces], dtype=float)
+        self._piece_start_x = np.array([piece[2][0] for piece in pieces], dtype=float)
+        self._piece_start_y = np.array([piece[2][1] for piece in pieces], dtype=float)
+        self._piece_cos = np.array([piece[3] for piece in pieces], dtype=float)
+        self._piece_sin = np.array([piece[4] for piece in pieces], dtype=float)
+        self._road_stop_distance = np.zeros(self._n_roads)
+        self._road_slow_factor = np.ones(self._n_roads)
+        self._road_green = np.ones(self._n_roads, dtype=bool)
+        signal_roads = []
+        self._signal_groups = []
+        for i, road in enumerate(roads):
+            if road.has_traffic_signal:
+                self._road_stop_distance[i] = road.traffic_signal.stop_distance
+                self._road_slow_factor[i] = road.traffic_signal.slow_factor
+                signal_roads.append(i)
+                self._signal_groups.append((road.traffic_signal, road.traffic_signal_group))
+        self._signal_roads = np.array(signal_roads, dtype=np.intp)
+        self._tables_dirty = False
+
+    def update(self, sims: List) -> None:
+        """ Updates the vehicles of the given simulations, all of which must be attached to the engine """
+        if self._tables_dirty or self._n_roads != sum(len(roads) for roads in self._lanes if roads):
+            self._build_road_tables()
+        slots = self.active_slots()
+        lane_t = np.full(len(self._lanes), np.nan)
+        for sim in sims:
+            lane_t[sim.lane] = sim.t
+        if len(sims) < len(self._lanes) - self._lanes.count(None):
+            # Leave out the vehicles of the lanes that aren't updated
+            slots = slots[~np.isnan(lane_t[self.lane[slots]])]
+        if not len(slots):
+            return
+
+        # Traffic signals (roads without a traffic signal are always green)
+        self._road_green[self._signal_roads] = [signal.current_cycle[group]
+                                                for signal, group in self._signal_groups]
+        lane = self.lane[slots]
+        road = self._lane_road_offset[lane] + self.road[slots]
+        x = self._step(sims, slots, lane, lane_t[lane], road, sims[0].dt)
+        self._update_positions(slots, road, x)
+
+    def _step(self, sims: List, slots: np.ndarray, lane: np.ndarray, sim_t: np.ndarray, road: np.ndarray,
+              dt: float) -> np.ndarray:
+        """ Applies the traffic signals to the lead vehicles, and updates the positions (relative to the
+        roads), velocities and accelerations of the vehicles in the given slots. Returns the new positions """
+        lead = self.lead[slots]
+        x, v, a = self.x[slots], self.v[slots], self.a[slots]
+        stopped = self.stopped[slots]
+        is_lead = lead < 0
+        green = self._road_green[road]
+
+        # Green light: unstop the lead vehicles and unslow every vehicle
+        unstop = is_lead & green & stopped
+        if unstop.any():
+            unstop_slots = slots[unstop]
+            stop_times = self.last_time_stopped[unstop_slots]
+            waiting_times = sim_t[unstop] - stop_times
+            self.waiting_time[unstop_slots] += waiting_times
+            self.last_time_stopped[unstop_slots] = np.nan
+            stopped[unstop] = False
+            self._count_stops(sims, lane[unstop], -1, -stop_times, waiting_times)
+        v_max_0 = self._v_max[slots]
+        v_max = np.where(green, v_max_0, self.v_max[slots])
+
+        # Red light: slow down lead vehicles that can stop safely, and stop those in the stop zone
+        red_lead = is_lead & ~green
+        if red_lead.any():
+            road_length = self._road_length[road]
+            stop_distance = self._road_stop_distance[road]
+            can_stop_safely = red_lead & (x <= road_length - stop_distance / 1.5)
+            v_max[can_stop_safely] = (v_max_0 * self._road_slow_factor[road])[can_stop_safely]
+            stop = can_stop_safely & (road_length - stop_distance <= x) & ~stopped
+            if stop.any():
+                self.last_time_stopped[slots[stop]] = sim_t[stop]
+                stopped[stop] = True
+                self._count_stops(sims, lane[stop], 1, sim_t[stop], np.zeros(stop.sum()))
+        self.v_max[slots] = v_max
+        self.stopped[slots] = stopped
+
+        # Update position and velocity
+        v_next = v + a * dt
+        backwards = v_next < 0
+        if backwards.any():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x = np.where(backwards, x - 1 / 2 * v * v / a, x + (v_next * dt + a * dt * dt / 2))
+            v_next[backwards] = 0
+        else:
+            x += v_next * dt + a * dt * dt / 2
+        v = v_next
+        self.x[slots] = x
+        self.v[slots] = v
+
+        # Update acceleration, using the updated position and velocity of the lead vehicles
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_x = self.x[lead] - x - self.length[lead]
+            delta_v = v - self.v[lead]
+            alpha = (self.s0[slots] + np.maximum(0, self.T[slots] * v + delta_v * v / self.sqrt_ab[slots])) / delta_x
+        alpha[is_lead] = 0
+        self.a[slots] = np.where(stopped, -self.b_max[slots] * v / v_max,
+                                 self.a_max[slots] * (1 - (v / v_max) ** 4 - alpha ** 2))
+        return x
+
+    def _update_positions(self, slots: np.ndarray, road: np.ndarray, x: np.ndarray) -> None:
+        """ Updates the coordinates of the vehicles in the given slots from their positions on their roads """
+        if self._curved:
+            key = self._road_key[road] + np.minimum(x, self._road_length[road])
+            piece = np.searchsorted(self._piece_key, key, side='right') - 1
+            x = x - self._piece_offset[piece]
+        else:
+            piece = road
+        self.position_x[slots] = self._piece_start_x[piece] + self._piece_cos[piece] * x
+        self.position_y[slots] = self._piece_start_y[piece] + self._piece_sin[piece] * x
+
+    @staticmethod
+    def _count_stops(sims: List, lanes: np.ndarray, n: int, stop_times: np.ndarray,
+                     waiting_times: np.ndarray) -> None:
+        """ Updates the running wait time sums of the simulations whose vehicles stopped (n=1)
+        or resumed (n=-1), see Simulation.count_stops() """
+        sims_by_lane = {sim.lane: sim for sim in sims}
+        for lane in np.unique(lanes):
+            in_lane = lanes == lane
+            sims_by_lane[lane].count_stops(n * int(in_lane.sum()), float(stop_times[in_lane].sum()),
+                                           float(waiting_times[in_lane].sum()))
+
+
+class JitEngine(NumpyEngine):
+    """
+    NumpyEngine with the traffic signal logic and the IDM update compiled with Numba into a single pass over
+    the vehicles, see TrafficSimulator.idm_kernel. Numba is an optional dependency: without it, the engine
+    warns and runs the NumPy update
+    """
+    name = 'jit'
+
+    def __init__(self, capacity: int = 64):
+        super().__init__(capacity)
+        self._kernel = compiled_idm_step()
+        if self._kernel is None:
+            warnings.warn("Numba isn't installed, the jit engine runs the NumPy engine update", RuntimeWarning)
+
+    @property
+    def compiled(self) -> bool:
+        """ Whether the engine runs the compiled kernel """
+        return self._kernel is not None
+
+    def _step(self, sims: List, slots: np.ndarray, lane: np.ndarray, sim_t: np.ndarray, road: np.ndarray,
+              dt: float) -> np.ndarray:
+        if self._kernel is None:
+            return super()._step(sims, slots, lane, sim_t, road, dt)
+        events = np.empty(len(slots), dtype=np.int8)
+        event_times = np.empty(len(slots))
+        self._kernel(slots, sim_t, road, dt, self.lead, self.x, self.v, self.a, self.v_max, self._v_max,
+                     self.stopped, self.last_time_stopped, self.waiting_time, self.length, self.s0, self.T,
+                     self.a_max, self.b_max, self.sqrt_ab, self._road_green, self._road_length,
+                     self._road_stop_distance, self._road_slow_factor, events, event_times)
+        unstop = events == -1
+        if unstop.any():
+            stop_times = event_times[unstop]
+            self._count_stops(sims, lane[unstop], -1, -stop_times, sim_t[unstop] - stop_times)
+        stop = events == 1
+        if stop.any():
+            self._count_stops(sims, lane[stop], 1, event_times[stop], np.zeros(stop.sum()))
+        return self.x[slots]
+
+
+ENGINES: Dict[str, Type] = {'object': ObjectEngine, 'numpy': NumpyEngine, 'jit': JitEngine}
@@ -0,0 +1,72 @@
+from functools import lru_cache
+from typing import Callable, Optional
+
+import numpy as np
+
+
+def idm_step(slots, sim_t, road, dt, lead, x, v, a, v_max, v_max_0, stopped, last_time_stopped, waiting_time,
+             length, s0, T, a_max, b_max, sqrt_ab, road_green, road_length, road_stop_distance, road_slow_factor,
+             events, event_times):
+    """
+    The scalar form of NumpyEngine._step, meant to be compiled, see compiled_idm_step(). Updates the vehicles
+    in the given slots of the engine arrays, in place. sim_t and road hold the simulation time and the road
+    table index of every slot. The traffic signal stops and resumes are written to events (1 for a stop,
+    -1 for a resume, else 0) and event_times (the time of the stop)
+    """
+    n = len(slots)
+    # Traffic signals: unstop the lead vehicles and unslow every vehicle on green, and slow down the lead
+    # vehicles that can stop safely on red, stopping those in the stop zone
+    for k in range(n):
+        i = slots[k]
+        r = road[k]
+        events[k] = 0
+        if road_green[r]:
+            v_max[i] = v_max_0[i]
+            if lead[i] < 0 and stopped[i]:
+                events[k] = -1
+                event_times[k] = last_time_stopped[i]
+                waiting_time[i] += sim_t[k] - last_time_stopped[i]
+                last_time_stopped[i] = np.nan
+                stopped[i] = False
+        elif lead[i] < 0 and x[i] <= road_length[r] - road_stop_distance[r] / 1.5:
+            v_max[i] = v_max_0[i] * road_slow_factor[r]
+            if road_length[r] - road_stop_distance[r] <= x[i] and not stopped[i]:
+                events[k] = 1
+                event_times[k] = sim_t[k]
+                last_time_stopped[i] = sim_t[k]
+                stopped[i] = True
+
+    # Update position and velocity
+    for k in range(n):
+        i = slots[k]
+        v_next = v[i] + a[i] * dt
+        if v_next < 0:
+            x[i] -= 1 / 2 * v[i] * v[i] / a[i]
+            v[i] = 0.0
+        else:
+            x[i] += v_next * dt + a[i] * dt * dt / 2
+            v[i] = v_next
+
+    # Update acceleration, using the updated position and velocity of the lead vehicles
+    for k in range(n):
+        i = slots[k]
+        if stopped[i]:
+            a[i] = -b_max[i] * v[i] / v_max[i]
+            continue
+        alpha = 0.0
+        j = lead[i]
+        if j >= 0:
+            delta_x = x[j] - x[i] - length[j]
+            delta_v = v[i] - v[j]
+            alpha = (s0[i] + max(0.0, T[i] * v[i] + delta_v * v[i] / sqrt_ab[i])) / delta_x
+        a[i] = a_max[i] * (1 - (v[i] / v_max[i]) ** 4 - alpha ** 2)
+
+
+@lru_cache(maxsize=None)
+def compiled_idm_step() -> Optional[Callable]:
+    """ Returns idm_step compiled with Numba, or None if Numba isn't installed. Numba is only imported here """
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+    return njit(cache=True, nogil=True, error_model='numpy')(idm_step)
@@ -0,0 +1,39 @@
+from time import perf_counter
+from typing import Optional
+
+
+class RenderPolicy:
+    """
+    When the Window draws a frame: on every k-th simulation update, and at most max_fps frames per wall clock
+    second (uncapped if None). Between frames the simulation keeps updating at full speed, and the window
+    events are polled at most poll_rate times per wall clock second, so the window stays responsive.
+    The default policy draws every update
+    """
+
+    def __init__(self, max_fps: Optional[float] = None, every: int = 1, poll_rate: float = 30):
+        self.max_fps: Optional[float] = max_fps
+        self.every: int = every
+        self.poll_rate: float = poll_rate
+        self._n_updates: int = 0  # Updates since the last frame
+        self._last_frame: float = -float('inf')
+        self._last_poll: float = -float('inf')
+
+    def frame_due(self) -> bool:
+        """ Counts an update, and returns whether a frame should be drawn after it """
+        self._n_updates += 1
+        if self._n_updates < self.every:
+            return False
+        now = perf_counter()
+        if self.max_fps and now - self._last_frame < 1 / self.max_fps:
+            return False
+        self._n_updates = 0
+        self._last_frame = self._last_poll = now
+        return True
+
+    def poll_due(self) -> bool:
+        """ Returns whether the window events should be polled, between frames """
+        now = perf_counter()
+        if now - self._last_poll < 1 / self.poll_rate:
+            return False
+        self._last_poll = now
+        return True
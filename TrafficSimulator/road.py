@@ -1,13 +1,22 @@
+from bisect import bisect_right
 from collections import deque
-from typing import Deque, Optional, Tuple
-
-from scipy.spatial import distance
+from math import sqrt
+from typing import Deque, List, Optional, Tuple
 
 from TrafficSimulator.traffic_signal import TrafficSignal
 from TrafficSimulator.vehicle import Vehicle
 
 
+def euclidean(start: Tuple, end: Tuple) -> float:
+    """ Returns the distance between two points """
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    return sqrt(dx * dx + dy * dy)
+
+
 class Road:
+    __slots__ = ('start', 'end', 'index', 'vehicles', 'length', 'angle_sin', 'angle_cos', 'points', 'pieces',
+                 'has_traffic_signal', 'traffic_signal', 'traffic_signal_group')
+
     def __init__(self, start: Tuple[int, int], end: Tuple[int, int], index: int):
         self.start = start
         self.end = end
@@ -15,10 +24,14 @@ class Road:
 
         self.vehicles: Deque[Vehicle] = deque()
 
-        self.length: float = distance.euclidean(self.start, self.end)
+        self.length: float = euclidean(self.start, self.end)
         self.angle_sin: float = (self.end[1] - self.start[1]) / self.length
         self.angle_cos: float = (self.end[0] - self.start[0]) / self.length
 
+        # The polyline of the road, and its straight pieces: (arc length offset, length, start, cos, sin)
+        self.points: List[Tuple] = [self.start, self.end]
+        self.pieces: List[Tuple] = [(0.0, self.length, self.start, self.angle_cos, self.angle_sin)]
+
         self.has_traffic_signal: bool = False
         self.traffic_signal: Optional[TrafficSignal] = None
         self.traffic_signal_group: Optional[int] = None
@@ -31,6 +44,14 @@ class Road:
     def __str__(self):
         return f'Road {self.index}'
 
+    def position(self, x: float) -> Tuple[float, float]:
+        """ Returns the coordinates of the point at arc length x along the road """
+        return self.start[0] + self.angle_cos * x, self.start[1] + self.angle_sin * x
+
+    def heading(self, x: float) -> Tuple[float, float]:
+        """ Returns the (sin, cos) of the road direction at arc length x """
+        return self.angle_sin, self.angle_cos
+
     @property
     def traffic_signal_state(self):
         """ Returns the traffic signal state if the road has a traffic signal, else True"""
@@ -68,3 +89,37 @@ class Road:
             for i in range(1, n):
                 lead = self.vehicles[i - 1]
                 self.vehicles[i].update(lead, dt, self)
+
+
+class CurvedRoad(Road):
+    """
+    A road along a polyline, such as a whole turn, parametrized by arc length. Positions and
+    headings are looked up from a precomputed table of the polyline's straight pieces.
+    The start, end and angle attributes describe the chord between the polyline's ends
+    """
+    __slots__ = ('_offsets',)
+
+    def __init__(self, points: List[Tuple], index: int):
+        super().__init__(points[0], points[-1], index)
+        self.points = list(points)
+        self.pieces = []
+        offset = 0.0
+        for start, end in zip(self.points, self.points[1:]):
+            length = euclidean(start, end)
+            cos, sin = (end[0] - start[0]) / length, (end[1] - start[1]) / length
+            self.pieces.append((offset, length, start, cos, sin))
+            offset += length
+        self.length = offset
+        self._offsets: List[float] = [piece[0] for piece in self.pieces]
+
+    def _piece(self, x: float) -> Tuple:
+        """ Returns the piece at arc length x. Positions past the ends extend the first and last pieces """
+        return self.pieces[max(0, bisect_right(self._offsets, x) - 1)]
+
+    def position(self, x: float) -> Tuple[float, float]:
+        offset, length, start, cos, sin = self._piece(x)
+        return start[0] + cos * (x - offset), start[1] + sin * (x - offset)
+
+    def heading(self, x: float) -> Tuple[float, float]:
+        offset, length, start, cos, sin = self._piece(x)
+        return sin, cos
@@ -0,0 +1,160 @@
+import multiprocessing as mp
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from TrafficSimulator.simulation import Simulation
+from TrafficSimulator.snapshot import VEHICLE_FIELDS
+
+_COUNT = 0  # The column of the number of vehicles, in the first row of a mailbox
+
+
+class Shard:
+    """
+    A region of a network, simulated by a worker process. Every tick, the vehicles that left the region are
+    written to the shard's outbox in shared memory, and after all the shards stepped, each shard adds the
+    vehicles of the other outboxes that entered its region. The outboxes alternate between two buffers by
+    tick parity, so a single barrier per tick separates writing a buffer from reading it
+    """
+
+    def __init__(self, sim: Simulation, region: Set[int], index: int, mailboxes: np.ndarray, barrier):
+        self.sim: Simulation = sim
+        self.index: int = index
+        # (shard, parity, row) buffers, the first row of every buffer holds its number of vehicles
+        self._mailboxes: np.ndarray = mailboxes
+        self._barrier = barrier
+        self._parity: int = 0
+        sim.set_region(region)
+
+    def tick(self) -> None:
+        """ Updates the region, then exchanges the vehicles crossing the region boundaries """
+        sim = self.sim
+        sim.update()
+        outbox = self._mailboxes[self.index, self._parity]
+        outbox[0, _COUNT] = len(sim.outbox)
+        if sim.outbox:
+            outbox[1:len(sim.outbox) + 1] = sim.outbox
+            sim.outbox.clear()
+        self._barrier.wait()
+        for shard, mailbox in enumerate(self._mailboxes[:, self._parity]):
+            n = int(mailbox[0, _COUNT])
+            if shard != self.index and n:
+                sim.receive(mailbox[1:n + 1])
+        self._parity ^= 1
+
+    def run(self, action: Optional[int] = None) -> None:
+        """ Equivalent to Simulation.run, except that collisions don't end the run """
+        n = 180  # 3 simulation seconds
+        if action:
+            self.sim._update_signals()
+            for _ in range(n):
+                self.tick()
+            self.sim._update_signals()
+        for _ in range(n):
+            self.tick()
+
+    def stats(self) -> Tuple:
+        """ Returns the shard's contributions to the network counters, see ShardedSimulation """
+        sim = self.sim
+        on_map_waiting_sum = sim._on_map_waiting_sum + sim._n_stopped * sim.t - sim._stop_times_sum
+        return (sim.t, sim.collision_detected, sim.n_vehicles_generated, sim.n_vehicles_on_map,
+                sim._waiting_times_sum, on_map_waiting_sum)
+
+
+def _serve(setup: Callable[[], Simulation], region: Set[int], index: int, mailboxes_name: str,
+           mailboxes_shape: Tuple, barrier, connection: Connection) -> None:
+    """ The worker process of a shard: runs the actions received from the coordinator, replying the stats """
+    memory = SharedMemory(mailboxes_name)
+    shard = None
+    try:
+        shard = Shard(setup(), region, index, np.ndarray(mailboxes_shape, buffer=memory.buf), barrier)
+        connection.send(shard.stats())
+        while True:
+            command, action = connection.recv()
+            if command == 'close':
+                break
+            shard.run(action)
+            connection.send(shard.stats())
+    except BaseException:
+        barrier.abort()  # Releases the other shards, instead of leaving them waiting for this one
+        raise
+    finally:
+        shard = None  # Releases the mailboxes view before closing the shared memory
+        memory.close()
+
+
+class ShardedSimulation:
+    """
+    Simulates a network split into regions, each stepped by its own worker process. Every worker builds the
+    whole network with setup(), a picklable callable, and owns the roads of its region (see
+    Simulation.set_region). Vehicles crossing the regions are handed over through shared memory every tick,
+    and the workers step in lockstep, so they share the simulation time and, running the same actions, the
+    traffic signal timing. For grids, see TrafficSimulator.Setups.grid.grid_regions.
+    Differs from a single simulation in that the shards number and start generating their vehicles
+    independently, and in that collisions don't end a run
+    """
+
+    def __init__(self, setup: Callable[[], Simulation], regions: List[Set[int]]):
+        n_roads = len(setup().roads)
+        # At most a vehicle leaves every road per tick
+        mailboxes_shape = (len(regions), 2, n_roads + 1, len(VEHICLE_FIELDS))
+        self._memory: SharedMemory = SharedMemory(create=True, size=int(np.prod(mailboxes_shape)) * 8)
+        barrier = mp.Barrier(len(regions))
+        self._connections: List[Connection] = []
+        self._workers: List[mp.Process] = []
+        for index, region in enumerate(regions):
+            connection, worker_connection = mp.Pipe()
+            worker = mp.Process(target=_serve, args=(setup, region, index, self._memory.name, mailboxes_shape,
+                                                     barrier, worker_connection), daemon=True)
+            worker.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._workers.append(worker)
+        self._stats: List[Tuple] = [connection.recv() for connection in self._connections]
+
+    def run(self, action: Optional[int] = None) -> None:
+        """ Performs 180 simulation updates in every shard, or 360 with an action, see Simulation.run """
+        for connection in self._connections:
+            connection.send(('run', action))
+        self._stats = [connection.recv() for connection in self._connections]
+        assert len({stats[0] for stats in self._stats}) == 1, 'The shards are out of sync'
+
+    def close(self) -> None:
+        """ Stops the workers and releases the shared memory """
+        for connection in self._connections:
+            connection.send(('close', None))
+        for worker in self._workers:
+            worker.join()
+        self._connections, self._workers = [], []
+        self._memory.close()
+        self._memory.unlink()
+
+    @property
+    def t(self) -> float:
+        return self._stats[0][0]
+
+    @property
+    def collision_detected(self) -> bool:
+        return any(stats[1] for stats in self._stats)
+
+    @property
+    def n_vehicles_generated(self) -> int:
+        return sum(stats[2] for stats in self._stats)
+
+    @property
+    def n_vehicles_on_map(self) -> int:
+        return sum(stats[3] for stats in self._stats)
+
+    @property
+    def current_average_wait_time(self) -> float:
+        """ Returns the average wait time of the network's vehicles, see Simulation.current_average_wait_time """
+        on_map_wait_time = 0
+        completed_wait_time = 0
+        n_completed_journey = self.n_vehicles_generated - self.n_vehicles_on_map
+        if n_completed_journey:
+            completed_wait_time = round(sum(stats[4] for stats in self._stats) / n_completed_journey, 2)
+        if self.n_vehicles_on_map:
+            on_map_wait_time = sum(stats[5] for stats in self._stats) / self.n_vehicles_on_map
+        return completed_wait_time + on_map_wait_time
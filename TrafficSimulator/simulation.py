@@ -1,18 +1,41 @@
-from itertools import chain
-from typing import List, Dict, Tuple, Set, Optional
-
-from scipy.spatial import distance
-
-from TrafficSimulator.road import Road
+import copy
+from collections import deque
+from functools import partial
+from math import inf, sqrt
+from typing import List, Dict, Tuple, Set, Optional, Union, TYPE_CHECKING
+
+import numpy as np
+from numpy.random import SeedSequence
+
+from TrafficSimulator.collision_detector import COLLISION_DETECTORS, ActiveConflicts, CollisionDetector
+from TrafficSimulator.engine import ENGINES
+from TrafficSimulator.render_policy import RenderPolicy
+from TrafficSimulator.road import Road, CurvedRoad
+from TrafficSimulator.snapshot import SimulationSnapshot, VEHICLE_FIELDS, pack_vehicle, unpack_vehicle
 from TrafficSimulator.traffic_signal import TrafficSignal
+from TrafficSimulator.trajectory_recorder import TrajectoryRecorder
+from TrafficSimulator.vehicle import Vehicle
 from TrafficSimulator.vehicle_generator import VehicleGenerator
-from TrafficSimulator.window import Window
+
+if TYPE_CHECKING:
+    from TrafficSimulator.window import Window
 
 
 class Simulation:
-    def __init__(self, max_gen: int = None):
+    def __init__(self, max_gen: int = None, engine: Union[str, object] = 'object',
+                 collision_detector: str = 'conflict_table', seed: Union[None, int, SeedSequence] = None,
+                 tolerance: Optional[float] = None):
         self.t = 0.0  # Time
         self.dt = 1 / 60  # Time step
+        # Adaptive stepping: with a tolerance, run() skips over the ticks in which nothing interacts, moving
+        # the vehicles analytically, see _skippable_ticks(). The tolerance bounds the position error, in
+        # meters, of a vehicle over a skipped window. The average wait time of an episode of 50 vehicles
+        # then differs from fixed stepping by at most 0.05 s up to 0.001 m, 0.15 s up to 0.005 m and 0.5 s
+        # up to 0.05 m, the largest errors over 100 episodes, checked by Benchmarks.adaptive. Above 0.005 m,
+        # a vehicle shifted across a signal switch waits a cycle more or less, which moves the average by
+        # ~0.4 s. Lockstep runs always use fixed steps
+        self.tolerance: Optional[float] = tolerance
+        self.n_skipped_ticks: int = 0
         self.roads: List[Road] = []
         self.generators: List[VehicleGenerator] = []
         self.traffic_signals: List[TrafficSignal] = []
@@ -21,44 +44,105 @@ class Simulation:
         self.n_vehicles_generated: int = 0
         self.n_vehicles_on_map: int = 0
 
-        self._gui: Optional[Window] = None
+        self._gui: Optional['Window'] = None  # The GUI, and pygame, are only imported by init_gui()
+        # Records the state after every update, see TrafficSimulator.trajectory_recorder
+        self.recorder: Optional[TrajectoryRecorder] = None
+
+        # Every generator draws from its own random stream, spawned from the simulation seed
+        self.seed_sequence: SeedSequence = seed if isinstance(seed, SeedSequence) else SeedSequence(seed)
+
+        # Vehicle update engine, a name from TrafficSimulator.engine.ENGINES or an engine instance
+        # shared with other simulations. The lane identifies the simulation within its engine
+        self._engine = ENGINES[engine]() if isinstance(engine, str) else engine
+        self.engine: str = self._engine.name
+        self.lane: int = self._engine.attach(self.roads)
 
         self._non_empty_roads: Set[int] = set()
         # To calculate the number of vehicles in the junction, use:
         # n_vehicles_on_map - _inbound_roads vehicles - _outbound_roads vehicles
         self._inbound_roads: Set[int] = set()
         self._outbound_roads: Set[int] = set()
+        # The generators' paths, referenced by their index in snapshots
+        self._paths: List[List[int]] = []
+        self._path_ids: Dict[int, int] = {}  # {id(path): path index}
 
         self._intersections: Dict[int, Set[int]] = {}  # {Road index: [intersecting roads' indexes]}
+        self._junction_roads: Set[int] = set()  # Roads with intersecting roads
+        # The pairs of non-empty intersecting roads, updated as roads become empty or non-empty
+        self._active_conflicts: ActiveConflicts = ActiveConflicts()
+        # See TrafficSimulator.collision_detector.COLLISION_DETECTORS. Holds the collision checks stats
+        self.collision_detector: CollisionDetector = COLLISION_DETECTORS[collision_detector]()
         self.max_gen: Optional[int] = max_gen  # Vehicle generation limit
         self._waiting_times_sum: float = 0  # for vehicles that completed the journey
 
+        # Running counts, updated as vehicles enter and leave roads
+        self.n_outbound_vehicles: int = 0  # Number of vehicles on the outbound roads
+        self.signal_group_counts: List[List[int]] = []  # Number of vehicles on every group of every signal
+        self._road_signal_groups: Dict[int, Tuple[int, int]] = {}  # {Road index: (signal index, group)}
+        # Running wait time sums of the vehicles on the map, updated by the engines upon stops, see count_stops()
+        self._on_map_waiting_sum: float = 0  # Wait time of completed stops
+        self._n_stopped: int = 0  # Number of stopped vehicles
+        self._stop_times_sum: float = 0  # Sum of the stopped vehicles' stop times
+
+        # The roads owned by the simulation when it's a shard of a larger network, see set_region(). Vehicles
+        # leaving the region are removed, and their snapshot rows are queued in the outbox
+        self._region: Optional[Set[int]] = None
+        self.outbox: List[Tuple] = []
+
     def add_intersections(self, intersections_dict: Dict[int, Set[int]]) -> None:
         self._intersections.update(intersections_dict)
+        for road, intersecting_roads in intersections_dict.items():
+            self._junction_roads.add(road)
+            self._junction_roads.update(intersecting_roads)
+        self._active_conflicts.add_intersections(intersections_dict, self._non_empty_roads)
+        self.collision_detector.add_intersections(intersections_dict, self.roads)
 
     def add_road(self, start: Tuple[int, int], end: Tuple[int, int]) -> None:
         road = Road(start, end, index=len(self.roads))
         self.roads.append(road)
 
-    def add_roads(self, roads: List[Tuple[int, int]]) -> None:
-        for road in roads:
-            self.add_road(*road)
+    def add_curved_road(self, points: List[Tuple]) -> None:
+        road = CurvedRoad(points, index=len(self.roads))
+        self.roads.append(road)
 
-    def add_generator(self, vehicle_rate, paths: List[List]) -> None:
+    def add_roads(self, roads: List[Tuple]) -> None:
+        """ Adds roads given as (start, end) pairs, or as polylines of more than two points """
+        for road in roads:
+            if len(road) > 2:
+                self.add_curved_road(road)
+            else:
+                self.add_road(*road)
+
+    def add_generator(self, vehicle_rate, paths: List[List], arrivals: Optional[np.ndarray] = None) -> None:
+        """ Adds a vehicle generator, which replays the given arrival trace if any, see
+        TrafficSimulator.arrival_trace. The trace must hold at least max_gen arrivals, or the episode would
+        never complete """
+        if arrivals is not None and self.max_gen and len(arrivals) < self.max_gen:
+            raise ValueError(f'The arrival trace holds {len(arrivals)} arrivals, fewer than the '
+                             f'{self.max_gen} vehicles of the episode')
         inbound_roads: List[Road] = [self.roads[roads[0]] for weight, roads in paths]
         inbound_dict: Dict[int: Road] = {road.index: road for road in inbound_roads}
-        vehicle_generator = VehicleGenerator(vehicle_rate, paths, inbound_dict)
+        vehicle_factory = partial(self._engine.create_vehicle, lane=self.lane)
+        rng = np.random.default_rng(self.seed_sequence.spawn(1)[0])
+        vehicle_generator = VehicleGenerator(vehicle_rate, paths, inbound_dict, vehicle_factory, rng, arrivals)
         self.generators.append(vehicle_generator)
 
         for (weight, roads) in paths:
             self._inbound_roads.add(roads[0])
             self._outbound_roads.add(roads[-1])
+            if id(roads) not in self._path_ids:
+                self._path_ids[id(roads)] = len(self._paths)
+                self._paths.append(roads)
 
     def add_traffic_signal(self, roads: List[List[int]], cycle: List[Tuple],
                            slow_distance: float, slow_factor: float, stop_distance: float) -> None:
         roads: List[List[Road]] = [[self.roads[i] for i in road_group] for road_group in roads]
         traffic_signal = TrafficSignal(roads, cycle, slow_distance, slow_factor, stop_distance)
+        for group, road_group in enumerate(roads):
+            for road in road_group:
+                self._road_signal_groups[road.index] = (len(self.traffic_signals), group)
         self.traffic_signals.append(traffic_signal)
+        self.signal_group_counts.append([sum(len(road.vehicles) for road in road_group) for road_group in roads])
 
     @property
     def gui_closed(self) -> bool:
@@ -87,14 +171,18 @@ class Simulation:
         :return: a dictionary of {non-empty road index: [non-empty intersecting roads indexes]}
         """
         output: Dict[int, Set[int]] = {}
-        non_empty_roads: Set[int] = self._non_empty_roads
-        for road in non_empty_roads:
-            if road in self._intersections:
-                intersecting_roads = self._intersections[road].intersection(non_empty_roads)
-                if intersecting_roads:
-                    output[road] = intersecting_roads
+        for i, j in self._active_conflicts.pairs:
+            if j in self._intersections.get(i, ()):
+                output.setdefault(i, set()).add(j)
+            if i in self._intersections.get(j, ()):
+                output.setdefault(j, set()).add(i)
         return output
 
+    @property
+    def active_conflicts(self) -> Set[Tuple[int, int]]:
+        """ Returns the pairs of non-empty intersecting roads, as (smaller index, larger index) """
+        return self._active_conflicts.pairs
+
     @property
     def current_average_wait_time(self) -> float:
         """ Returns the average wait time of vehicles
@@ -106,11 +194,32 @@ class Simulation:
         if n_completed_journey:
             completed_wait_time = round(self._waiting_times_sum / n_completed_journey, 2)
         if self.n_vehicles_on_map:
-            total_on_map_wait_time = sum(vehicle.get_wait_time(self.t) for i in self.non_empty_roads
-                                         for vehicle in self.roads[i].vehicles)
+            # Sum of vehicle.get_wait_time(self.t) over the vehicles on the map
+            total_on_map_wait_time = self._on_map_waiting_sum + self._n_stopped * self.t - self._stop_times_sum
             on_map_wait_time = total_on_map_wait_time / self.n_vehicles_on_map
         return completed_wait_time + on_map_wait_time
 
+    def count_stops(self, n: int, stop_times_sum: float, waiting_time: float) -> None:
+        """ Updates the running wait time sums. Called by the engines when vehicles stop, with
+        (1, t, 0), and when vehicles that stopped at s resume at t, with (-1, -s, t - s) """
+        self._n_stopped += n
+        self._stop_times_sum += stop_times_sum
+        self._on_map_waiting_sum += waiting_time
+
+    def _count_road_vehicles(self, road_index: int, n: int) -> None:
+        """ Updates the running counts after n vehicles entered (or -n vehicles left) a road """
+        if road_index in self._outbound_roads:
+            self.n_outbound_vehicles += n
+        if road_index in self._road_signal_groups:
+            signal, group = self._road_signal_groups[road_index]
+            self.signal_group_counts[signal][group] += n
+
+    def _count_exit(self, vehicle: Vehicle) -> None:
+        """ Removes a vehicle which left the map from the running wait time sums """
+        if vehicle.is_stopped:
+            self.count_stops(-1, -vehicle._last_time_stopped, 0)
+        self._on_map_waiting_sum -= vehicle._waiting_time
+
     @property
     def inbound_roads(self) -> Set[int]:
         return self._inbound_roads
@@ -119,11 +228,15 @@ class Simulation:
     def outbound_roads(self) -> Set[int]:
         return self._outbound_roads
 
-    def init_gui(self) -> None:
-        """ Initializes the GUI and updates the display """
+    def init_gui(self, policy: Optional[RenderPolicy] = None) -> None:
+        """ Initializes the GUI, drawing under the given render policy (every update by default),
+        and updates the display """
         if not self._gui:
-            self._gui = Window(self)
-        self._gui.update()
+            from TrafficSimulator.window import Window
+            self._gui = Window(self, policy)
+        elif policy:
+            self._gui.policy = policy
+        self._gui.update(force=True)
 
     def run(self, action: Optional[int] = None) -> None:
         """ Performs n simulation updates. Terminates early upon completion or GUI closing
@@ -140,12 +253,120 @@ class Simulation:
                 return
         self._loop(n)
 
+    def snapshot(self) -> SimulationSnapshot:
+        """ Returns the dynamic state of the simulation """
+        rows = [pack_vehicle(vehicle, self._path_ids[id(vehicle.path)])
+                for i in sorted(self._non_empty_roads) for vehicle in self.roads[i].vehicles]
+        vehicles = np.array(rows, dtype=float).reshape(len(rows), len(VEHICLE_FIELDS))
+        signals = [(signal.current_cycle_index, signal.prev_update_time) for signal in self.traffic_signals]
+        generators = [generator.get_state() for generator in self.generators]
+        return SimulationSnapshot(self.t, self.collision_detected, self.n_vehicles_generated,
+                                  self.n_vehicles_on_map, self._waiting_times_sum, signals, generators, vehicles)
+
+    def restore(self, snapshot: SimulationSnapshot) -> None:
+        """ Sets the dynamic state of the simulation from a snapshot of a simulation with the same topology """
+        # Remove the current vehicles
+        for i in self._non_empty_roads:
+            road = self.roads[i]
+            while road.vehicles:
+                vehicle = road.vehicles.popleft()
+                self._engine.on_leave(vehicle, road)
+                self._engine.on_exit(vehicle)
+        self._non_empty_roads = set()
+        self.n_outbound_vehicles = 0
+        self.signal_group_counts = [[0] * len(signal.roads) for signal in self.traffic_signals]
+        self._on_map_waiting_sum, self._n_stopped, self._stop_times_sum = 0, 0, 0
+
+        self.t = snapshot.t
+        self.collision_detected = snapshot.collision_detected
+        self.n_vehicles_generated = snapshot.n_vehicles_generated
+        self.n_vehicles_on_map = snapshot.n_vehicles_on_map
+        self._waiting_times_sum = snapshot.waiting_times_sum
+        for signal, (current_cycle_index, prev_update_time) in zip(self.traffic_signals, snapshot.signals):
+            signal.current_cycle_index = current_cycle_index
+            signal.prev_update_time = prev_update_time
+        for generator, state in zip(self.generators, snapshot.generators):
+            generator.set_state(state)
+
+        for row in snapshot.vehicles:
+            self._non_empty_roads.add(self._place_vehicle(row))
+        self._active_conflicts.reset(self._non_empty_roads)
+
+    def _place_vehicle(self, row: np.ndarray) -> int:
+        """ Adds a vehicle from its snapshot row to the end of its road, returns the road index.
+        Doesn't update n_vehicles_on_map and the non-empty roads """
+        vehicle = self._engine.create_vehicle(self._paths[int(row[VEHICLE_FIELDS.index('path')])], lane=self.lane)
+        unpack_vehicle(vehicle, row)
+        road = self.roads[vehicle.path[vehicle.current_road_index]]
+        road.vehicles.append(vehicle)
+        self._engine.on_enter(vehicle, road)
+        self._count_road_vehicles(road.index, 1)
+        self._on_map_waiting_sum += vehicle._waiting_time
+        if vehicle.is_stopped:
+            self.count_stops(1, vehicle._last_time_stopped, 0)
+        return road.index
+
+    def set_region(self, roads: Set[int]) -> None:
+        """ Makes the simulation a shard owning the given roads, see TrafficSimulator.sharded_simulation.
+        Only the generators of the region's roads are kept. Vehicles moving to roads outside the region
+        leave the simulation through the outbox, and vehicles entering it are added by receive() """
+        self._region = set(roads)
+        self.generators = [generator for generator in self.generators
+                           if self._region.issuperset(generator.inbound_roads)]
+
+    def receive(self, rows: np.ndarray) -> None:
+        """ Adds the vehicles, given by their snapshot rows, that entered the region, see set_region() """
+        path_column, road_column = VEHICLE_FIELDS.index('path'), VEHICLE_FIELDS.index('current_road_index')
+        for row in rows:
+            if self._paths[int(row[path_column])][int(row[road_column])] in self._region:
+                i = self._place_vehicle(row)
+                if i not in self._non_empty_roads:
+                    self._non_empty_roads.add(i)
+                    self._active_conflicts.occupy(i, self._non_empty_roads)
+                self.n_vehicles_on_map += 1
+
+    def fork(self) -> 'Simulation':
+        """ Returns an independent simulation in the same state, without a GUI. The fork shares the
+        immutable topology: road geometry, paths, intersections and traffic signal cycles """
+        sim = Simulation(self.max_gen, self.engine, seed=self.seed_sequence.spawn(1)[0], tolerance=self.tolerance)
+        for road in self.roads:
+            road = copy.copy(road)
+            road.vehicles = deque()
+            sim.roads.append(road)
+        for signal in self.traffic_signals:
+            signal = copy.copy(signal)
+            signal.roads = [[sim.roads[road.index] for road in road_group] for road_group in signal.roads]
+            for group, road_group in enumerate(signal.roads):
+                for road in road_group:
+                    road.set_traffic_signal(signal, group)
+            sim.traffic_signals.append(signal)
+        vehicle_factory = partial(sim._engine.create_vehicle, lane=sim.lane)
+        sim.generators = [generator.copy(sim.roads, vehicle_factory) for generator in self.generators]
+        sim._inbound_roads = self._inbound_roads
+        sim._outbound_roads = self._outbound_roads
+        sim._paths = self._paths
+        sim._path_ids = self._path_ids
+        sim._intersections = self._intersections
+        sim._junction_roads = self._junction_roads
+        sim._active_conflicts = self._active_conflicts.copy()
+        sim._road_signal_groups = self._road_signal_groups
+        sim.collision_detector = copy.copy(self.collision_detector)
+        sim.restore(self.snapshot())
+        return sim
+
+    def detach(self) -> None:
+        """ Releases the simulation from its engine, freeing its vehicles from a shared engine """
+        self._engine.detach(self.lane)
+
     def update(self) -> None:
         """ Updates the roads, generates vehicles, detect collisions and updates the gui """
         # Update every road
-        for i in self._non_empty_roads:
-            self.roads[i].update(self.dt, self.t)
+        self._engine.update([self])
+        self._update_map()
 
+    def _update_map(self) -> None:
+        """ Generates vehicles, moves out-of-bounds vehicles, detect collisions, increments the time
+        and updates the gui. Follows the roads update in self.update() """
         # Add vehicles
         for gen in self.generators:
             if self.max_gen and self.n_vehicles_generated == self.max_gen:
@@ -154,7 +375,12 @@ class Simulation:
             if road_index is not None:
                 self.n_vehicles_generated += 1
                 self.n_vehicles_on_map += 1
-                self._non_empty_roads.add(road_index)
+                if road_index not in self._non_empty_roads:
+                    self._non_empty_roads.add(road_index)
+                    self._active_conflicts.occupy(road_index, self._non_empty_roads)
+                self._count_road_vehicles(road_index, 1)
+                road = self.roads[road_index]
+                self._engine.on_enter(road.vehicles[-1], road)
 
         self._check_out_of_bounds_vehicles()
 
@@ -163,37 +389,114 @@ class Simulation:
         # Increment time
         self.t += self.dt
 
+        if self.recorder:
+            self.recorder.record(self)
+
         # Update the display
         if self._gui:
             self._gui.update()
 
     def _loop(self, n: int) -> None:
         """ Performs n simulation updates. Terminates early upon completion or GUI closing"""
-        for _ in range(n):
-            self.update()
+        i = 0
+        skipped = False
+        while i < n:
+            # A skip is followed by an update, which recomputes the accelerations
+            k = self._skippable_ticks(n - i) if self.tolerance is not None and not skipped else 0
+            skipped = bool(k)
+            if k:
+                self._skip(k)
+                i += k
+            else:
+                self.update()
+                i += 1
             if self.completed or self.gui_closed:
                 return
 
+    def _skippable_ticks(self, n: int) -> int:
+        """ Returns the number of the next ticks, up to n, in which nothing interacts, or 0 if fewer than 2.
+        In these ticks no vehicle is generated, and every vehicle stays on its road away from the junction,
+        isn't stopped, resumed, slowed or unslowed, and moves within the tolerance of its motion at a constant
+        acceleration. The traffic signals don't change within a run() loop """
+        if self._gui or not self._non_empty_roads.isdisjoint(self._junction_roads):
+            return 0
+        dt = self.dt
+        k = n
+        if not (self.max_gen and self.n_vehicles_generated == self.max_gen):
+            next_arrival = min((generator.next_arrival(self.n_vehicles_generated) for generator in self.generators),
+                               default=inf)
+            if next_arrival < inf:
+                # Keep a tick of margin for the rounding of self.t
+                k = min(k, int(max(next_arrival - self.t, 0) / dt) - 1)
+        window = k * dt
+        for i in self._non_empty_roads:
+            road = self.roads[i]
+            green = road.traffic_signal_state
+            lead = None
+            for vehicle in road.vehicles:
+                if k < 2:
+                    return 0
+                if vehicle.a:
+                    # The acceleration relaxes at rates below 1/s, so the position error over a window
+                    # of h seconds at a constant acceleration is below |a| * h ** 2 / 2
+                    k = min(k, int(sqrt(2 * self.tolerance / abs(vehicle.a)) / dt))
+                bound = road.length  # Moving to the next road
+                if lead is None and green:
+                    if vehicle.is_stopped or vehicle.v_max != vehicle._v_max:
+                        return 0  # Resumed or unslowed by the traffic signal
+                elif lead is None and road.has_traffic_signal and not vehicle.is_stopped:
+                    signal = road.traffic_signal
+                    if vehicle.x <= road.length - signal.stop_distance / 1.5:
+                        if vehicle.v_max != vehicle._v_max * signal.slow_factor or \
+                                vehicle.x >= road.length - signal.stop_distance:
+                            return 0  # Slowed or stopped by the traffic signal
+                        bound = road.length - signal.stop_distance  # Entering the stop zone
+                elif lead is not None:
+                    if green and vehicle.v_max != vehicle._v_max:
+                        return 0
+                    # Closing in by at most a tenth of the gap to the lead vehicle
+                    closing = vehicle.v - lead.v + (abs(vehicle.a) + abs(lead.a)) * window
+                    if closing > 0:
+                        k = min(k, int(0.1 * (lead.x - vehicle.x - lead.length) / (closing * dt)))
+                # The largest velocity of the vehicle within the window
+                v = vehicle.v + max(vehicle.a, 0) * window
+                if v > 0:
+                    k = min(k, int((bound - vehicle.x) / (v * dt)) - 1)
+                lead = vehicle
+        return k if k >= 2 else 0
+
+    def _skip(self, k: int) -> None:
+        """ Advances the simulation by k ticks, integrating the vehicles' motion at their current
+        accelerations like k vehicle updates would """
+        dt = self.dt
+        window = k * dt
+        for i in self._non_empty_roads:
+            road = self.roads[i]
+            for vehicle in road.vehicles:
+                v, a = vehicle.v, vehicle.a
+                if v + a * window < 0:
+                    vehicle.x -= 1 / 2 * v * v / a
+                    vehicle.v = 0
+                else:
+                    vehicle.v = v + a * window
+                    vehicle.x += v * window + a * window * (window / 2 + dt)
+                vehicle.position = road.position(vehicle.x)
+        for _ in range(k):
+            self.t += dt
+        self.n_skipped_ticks += k
+        if self.recorder:
+            self.recorder.record(self)
+
     def _update_signals(self) -> None:
-        """ Updates all the simulation traffic signals and updates the gui, if exists """
+        """ Updates all the simulation traffic signals. The gui shows them upon the next update """
         for traffic_signal in self.traffic_signals:
             traffic_signal.update()
-        if self._gui:
-            self._gui.update()
 
     def _detect_collisions(self) -> None:
-        """ Detects collisions by checking all non-empty intersecting vehicle paths.
+        """ Detects collisions between vehicles on non-empty intersecting roads.
         Updates the self.collision_detected attribute """
-        radius = 3
-        for main_road, intersecting_roads in self.intersections.items():
-            vehicles = self.roads[main_road].vehicles
-            intersecting_vehicles = chain.from_iterable(
-                self.roads[i].vehicles for i in intersecting_roads)
-            for vehicle in vehicles:
-                for intersecting in intersecting_vehicles:
-                    if distance.euclidean(vehicle.position, intersecting.position) < radius:
-                        self.collision_detected = True
-                        return
+        if self.collision_detector.detect(self.roads, self._active_conflicts):
+            self.collision_detected = True
 
     def _check_out_of_bounds_vehicles(self):
         """ Check roads for out-of-bounds vehicles, updates self.non_empty_roads """
@@ -208,25 +511,80 @@ class Simulation:
                 if lead.current_road_index + 1 < len(lead.path):
                     # Remove it from its road
                     road.vehicles.popleft()
+                    self._engine.on_leave(lead, road)
                     # Reset the position relative to the road
                     lead.x = 0
                     # Add it to the next road
                     lead.current_road_index += 1
                     next_road_index = lead.path[lead.current_road_index]
-                    new_non_empty_roads.add(next_road_index)
-                    self.roads[next_road_index].vehicles.append(lead)
+                    self._count_road_vehicles(road.index, -1)
+                    if self._region is None or next_road_index in self._region:
+                        new_non_empty_roads.add(next_road_index)
+                        next_road = self.roads[next_road_index]
+                        next_road.vehicles.append(lead)
+                        self._engine.on_enter(lead, next_road)
+                        self._count_road_vehicles(next_road_index, 1)
+                    else:
+                        # Hand it over to the shard owning the next road
+                        self.n_vehicles_on_map -= 1
+                        self._count_exit(lead)
+                        self.outbox.append(pack_vehicle(lead, self._path_ids[id(lead.path)]))
+                        self._engine.on_exit(lead)
                     # road.vehicles.popleft()
                     if not road.vehicles:
                         new_empty_roads.add(road.index)
                 else:
                     # Remove it from its road
                     road.vehicles.popleft()
+                    self._engine.on_leave(lead, road)
                     # Remove from non_empty_roads if it has no vehicles
                     if not road.vehicles:
                         new_empty_roads.add(road.index)
                     self.n_vehicles_on_map -= 1
                     # Update the waiting times sum
                     self._waiting_times_sum += lead.get_wait_time(self.t)
-
+                    self._count_road_vehicles(road.index, -1)
+                    self._count_exit(lead)
+                    # The engine may reuse the vehicle from now on
+                    self._engine.on_exit(lead)
+
+        # Update the active conflicts of the roads that changed between empty and non-empty
+        emptied_roads = new_empty_roads - new_non_empty_roads
+        occupied_roads = new_non_empty_roads - self._non_empty_roads
         self._non_empty_roads.difference_update(new_empty_roads)
         self._non_empty_roads.update(new_non_empty_roads)
+        for i in emptied_roads:
+            self._active_conflicts.vacate(i)
+        for i in occupied_roads:
+            self._active_conflicts.occupy(i, self._non_empty_roads)
+
+
+def run_lockstep(sims: List[Simulation], actions: List[Optional[int]]) -> None:
+    """ Equivalent to calling sim.run(action) for every simulation and its action, but steps the
+    simulations together, tick by tick. The vehicles of simulations that share an engine
+    are updated in a single engine update per tick """
+    n = 180  # 3 simulation seconds
+    # Actions switch the signals before and after an additional n updates, see Simulation.run
+    switching = [sim for sim, action in zip(sims, actions) if action]
+    for sim in switching:
+        sim._update_signals()
+    _loop_lockstep(sims, n)
+    switching = [sim for sim in switching if not (sim.collision_detected or sim.gui_closed)]
+    for sim in switching:
+        sim._update_signals()
+    _loop_lockstep([sim for sim in switching if not (sim.completed or sim.gui_closed)], n)
+
+
+def _loop_lockstep(sims: List[Simulation], n: int) -> None:
+    """ Performs n updates of every simulation. Simulations that complete stop updating """
+    for _ in range(n):
+        if not sims:
+            return
+        engines = {}
+        for sim in sims:
+            engines.setdefault(id(sim._engine), (sim._engine, []))[1].append(sim)
+        for engine, engine_sims in engines.values():
+            engine.update(engine_sims)
+        for sim in sims:
+            sim._update_map()
+        sims = [sim for sim in sims if not (sim.completed or sim.gui_closed)]
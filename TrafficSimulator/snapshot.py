@@ -0,0 +1,50 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from TrafficSimulator.vehicle import Vehicle
+
+# The columns of the snapshot vehicles buffer. The path column holds the index of the path in the simulation
+VEHICLE_FIELDS = ('index', 'path', 'current_road_index', 'x', 'v', 'a', 'v_max', 'is_stopped',
+                  'last_time_stopped', 'waiting_time', 'position_x', 'position_y')
+
+
+class SimulationSnapshot:
+    """
+    The dynamic state of a simulation: time, counters, traffic signal and generator states, and the
+    vehicles, stored in a single array with a row per vehicle (see VEHICLE_FIELDS) ordered by road and
+    by order on the road. The topology of the simulation isn't stored
+    """
+
+    def __init__(self, t: float, collision_detected: bool, n_vehicles_generated: int, n_vehicles_on_map: int,
+                 waiting_times_sum: float, signals: List[Tuple], generators: List[Tuple], vehicles: np.ndarray):
+        self.t: float = t
+        self.collision_detected: bool = collision_detected
+        self.n_vehicles_generated: int = n_vehicles_generated
+        self.n_vehicles_on_map: int = n_vehicles_on_map
+        self.waiting_times_sum: float = waiting_times_sum
+        self.signals: List[Tuple] = signals  # [(current cycle index, previous update time)]
+        self.generators: List[Tuple] = generators  # [VehicleGenerator.get_state()]
+        self.vehicles: np.ndarray = vehicles
+
+
+def pack_vehicle(vehicle: Vehicle, path: int) -> Tuple:
+    """ Returns the snapshot row of a vehicle, given the index of its path """
+    last_time_stopped = vehicle._last_time_stopped
+    x, y = vehicle.position
+    return (vehicle.index, path, vehicle.current_road_index, vehicle.x, vehicle.v, vehicle.a, vehicle.v_max,
+            vehicle.is_stopped, np.nan if last_time_stopped is None else last_time_stopped,
+            vehicle._waiting_time, np.nan if x is None else x, np.nan if y is None else y)
+
+
+def unpack_vehicle(vehicle: Vehicle, row: np.ndarray) -> None:
+    """ Sets the dynamic state of a vehicle from its snapshot row """
+    (index, path, current_road_index, x, v, a, v_max, is_stopped, last_time_stopped, waiting_time,
+     position_x, position_y) = row.tolist()
+    vehicle.index = int(index)
+    vehicle.current_road_index = int(current_road_index)
+    vehicle.x, vehicle.v, vehicle.a, vehicle.v_max = x, v, a, v_max
+    vehicle.is_stopped = bool(is_stopped)
+    vehicle._last_time_stopped = None if np.isnan(last_time_stopped) else last_time_stopped
+    vehicle._waiting_time = waiting_time
+    vehicle.position = (None, None) if np.isnan(position_x) else (position_x, position_y)
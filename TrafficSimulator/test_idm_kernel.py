@@ -0,0 +1,58 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from TrafficSimulator.Setups import two_way_intersection_setup
+from TrafficSimulator.engine import JitEngine
+from TrafficSimulator.idm_kernel import compiled_idm_step, idm_step
+
+N_EPISODES = 2
+N_ACTIONS = 20
+TOLERANCE = 1e-9  # Of positions, velocities, accelerations and wait times
+
+
+def _state(sim) -> np.ndarray:
+    """ Returns the rows (index, road, x, v, a) of the vehicles on the map, ordered by road and position """
+    return np.array([(vehicle.index, road.index, vehicle.x, vehicle.v, vehicle.a)
+                     for road in sim.roads for vehicle in road.vehicles]).reshape(-1, 5)
+
+
+@pytest.fixture(params=['compiled', 'python', 'fallback'])
+def jit_engine(request):
+    """ Returns a factory of JitEngines running the Numba compiled kernel, the kernel as Python, or the
+    NumPy update that JitEngine falls back to without Numba """
+    if request.param == 'compiled':
+        kernel = compiled_idm_step()
+        if kernel is None:
+            pytest.skip("Numba isn't installed, the compiled kernel isn't checked")
+    else:
+        kernel = idm_step if request.param == 'python' else None
+
+    def factory() -> JitEngine:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            engine = JitEngine()
+        engine._kernel = kernel
+        return engine
+
+    return factory
+
+
+def test_jit_engine_matches_object_engine(jit_engine):
+    """ The same episodes run with the object engine, Vehicle.update and Road.update, and with the jit engine
+    have the same vehicles, states and wait times after every action """
+    for seed in range(N_EPISODES):
+        actions = np.random.default_rng(seed).integers(0, 2, N_ACTIONS)
+        reference = two_way_intersection_setup(engine='object', seed=seed)
+        sim = two_way_intersection_setup(engine=jit_engine(), seed=seed)
+        for action in actions:
+            reference.run(action)
+            sim.run(action)
+            expected, actual = _state(reference), _state(sim)
+            assert expected.shape == actual.shape and (expected[:, :2] == actual[:, :2]).all(), \
+                f"Episode {seed}, the vehicles differ at t={sim.t:.2f}"
+            np.testing.assert_allclose(actual[:, 2:], expected[:, 2:], rtol=0, atol=TOLERANCE)
+            assert abs(reference.current_average_wait_time - sim.current_average_wait_time) <= TOLERANCE
+            if reference.completed:
+                break
@@ -0,0 +1,39 @@
+import numpy as np
+
+from TrafficSimulator.Setups import two_way_intersection_setup
+from TrafficSimulator.trajectory_recorder import TrajectoryRecorder
+from TrafficSimulator.trajectory_replay import TrajectoryReplay
+
+
+class CountingRecorder(TrajectoryRecorder):
+    """ Also keeps the (time, number of vehicles) of every recorded update """
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self.recorded = []
+
+    def record(self, sim) -> None:
+        super().record(sim)
+        self.recorded.append((sim.t, sim.n_vehicles_on_map))
+
+
+def test_replay_adaptive_stepping(tmp_path):
+    """ A run with adaptive stepping records once per skipped run of ticks, the replay shows the vehicles of
+    the last recorded update throughout the gap """
+    sim = two_way_intersection_setup(engine='object', seed=1, tolerance=0.1)
+    sim.recorder = CountingRecorder(str(tmp_path))
+    for i in range(20):
+        sim.run(i % 3 == 0)
+    sim.recorder.close()
+    assert sim.n_skipped_ticks
+    recorded = sim.recorder.recorded
+
+    replay = TrajectoryReplay(str(tmp_path))
+    times = np.array([t for t, n in recorded])
+    gaps = np.diff(times)
+    assert any(n for (t, n), gap in zip(recorded, gaps) if gap > 1.5 * sim.dt), "No skipped run with vehicles"
+    for (t, n), gap in zip(recorded, np.append(gaps, 0)):
+        replay.seek(t)
+        assert replay.n_vehicles_on_map == n
+        replay.seek(t + gap / 2)
+        assert replay.n_vehicles_on_map == n
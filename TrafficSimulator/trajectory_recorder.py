@@ -0,0 +1,227 @@
+import json
+import os
+from itertools import chain
+from operator import attrgetter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from TrafficSimulator.engine import NumpyEngine
+from TrafficSimulator.vehicle import CAR
+
+# A row per vehicle on the map per recorded tick. The green column is the traffic signal state of the road
+TRAJECTORY_DTYPE = np.dtype([('t', '<f8'), ('vehicle', '<i4'), ('road', '<i4'), ('x', '<f8'), ('v', '<f8'),
+                             ('a', '<f8'), ('stopped', '?'), ('green', '?')])
+# A row per traffic signal change, seen at the recorded ticks, and per traffic signal on the first recorded tick
+SIGNALS_DTYPE = np.dtype([('t', '<f8'), ('signal', '<i4'), ('cycle_index', '<i4')])
+# A row per recorded update. Its vehicles are the n_vehicles rows of the vehicles table from the row index start,
+# none if the map was empty
+FRAMES_DTYPE = np.dtype([('t', '<f8'), ('start', '<i8'), ('n_vehicles', '<i4')])
+TABLES: Dict[str, np.dtype] = {'vehicles': TRAJECTORY_DTYPE, 'signals': SIGNALS_DTYPE, 'frames': FRAMES_DTYPE}
+HEADER = 'trajectory.json'
+# The vehicle state columns read from the Vehicle objects, see TrajectoryRecorder._record_vehicles()
+VEHICLE_STATE = attrgetter('index', 'x', 'v', 'a', 'is_stopped')
+STAGED_ROWS = 4096  # The number of rows staged as tuples before they're copied into the chunk
+
+
+class TrajectoryRecorder:
+    """
+    Records the state of a simulation after every update, and appends it in chunks of chunk_size rows to a
+    columnar directory: a raw binary file per column of every table (vehicles.x, signals.t...), described by
+    a JSON header, see load_trajectory(). The header also describes the network, written upon the first
+    update, and the frames table indexes the vehicles rows of every recorded update, so that the trajectory
+    can be replayed without the simulation, see TrafficSimulator.trajectory_replay.
+    Every table is buffered in a preallocated NumPy array per column, filled by slices, and written once full.
+    With an array engine, the vehicle states are copied from the engine arrays at their slots, a slice per
+    column per update. The frames rows, and with the object engine the vehicle states of the non-empty roads,
+    are staged as tuples and copied STAGED_ROWS at a time, since copying a few Python values into NumPy
+    arrays costs more than reading them. With every > 1, only every k-th update is recorded.
+    Attach it with simulation.recorder = TrajectoryRecorder(directory), and close it at the end of the
+    recording
+    """
+
+    def __init__(self, directory: str, chunk_size: int = 1 << 16, every: int = 1):
+        self.directory: str = directory
+        self.chunk_size: int = chunk_size
+        self.every: int = every
+        self._n_updates: int = 0
+        os.makedirs(directory, exist_ok=True)
+        self._write_header()
+        # A chunk per table, an array per column in the table order
+        self._chunks: Dict[str, List[np.ndarray]] = {
+            table: [np.empty(chunk_size, dtype[name]) for name in dtype.names] for table, dtype in TABLES.items()}
+        self._n_rows: Dict[str, int] = {table: 0 for table in TABLES}  # The filled rows of every chunk
+        self._n_vehicles_rows: int = 0  # The vehicles rows recorded so far
+        self._staged: Dict[str, List[Tuple]] = {table: [] for table in TABLES}  # Rows not copied yet
+        # The staged vehicle states, rows of VEHICLE_STATE, and their runs, a (t, road, green, number of rows)
+        # row per non-empty road per update
+        self._staged_states: List[Tuple] = []
+        self._staged_runs: List[Tuple] = []
+        self._files = {table: {name: open(os.path.join(directory, f'{table}.{name}'), 'wb') for name in dtype.names}
+                       for table, dtype in TABLES.items()}
+        self._cycle_indexes: List[int] = []  # The last recorded cycle index of every traffic signal
+        # The traffic signal state of every road, since the last signal change, as a list and an array
+        self._greens: List[bool] = []
+        self._green_roads: np.ndarray = np.empty(0, dtype=bool)
+
+    def record(self, sim) -> None:
+        """ Appends the current state of the simulation, on every k-th call """
+        self._n_updates += 1
+        if self.every > 1 and self._n_updates % self.every != 1:
+            return
+        if self._n_updates == 1:
+            self._write_header(self._network(sim))
+        t = sim.t
+        cycle_indexes = [signal.current_cycle_index for signal in sim.traffic_signals]
+        if cycle_indexes != self._cycle_indexes:
+            changed = [i for i, cycle_index in enumerate(cycle_indexes)
+                       if i >= len(self._cycle_indexes) or cycle_index != self._cycle_indexes[i]]
+            self._append('signals', len(changed), (t, changed, [cycle_indexes[i] for i in changed]))
+            self._cycle_indexes = cycle_indexes
+            self._greens = [road.traffic_signal_state for road in sim.roads]
+            self._green_roads = np.array(self._greens)
+
+        if isinstance(sim._engine, NumpyEngine):
+            n = self._record_slots(t, sim._engine, sim._engine.active_slots(sim.lane))
+        else:
+            n = self._record_vehicles(t, sim)
+        self._stage('frames', (t, self._n_vehicles_rows, n))
+        self._n_vehicles_rows += n
+
+    def _record_vehicles(self, t: float, sim) -> int:
+        """ Stages the vehicles rows, read road by road. Returns their number """
+        roads = sim.roads
+        greens = self._greens
+        states, runs = self._staged_states, self._staged_runs
+        n_staged = len(states)
+        for i in sim.non_empty_roads:
+            road_vehicles = roads[i].vehicles
+            states += map(VEHICLE_STATE, road_vehicles)
+            runs.append((t, i, greens[i], len(road_vehicles)))
+        n = len(states) - n_staged
+        if len(states) >= STAGED_ROWS:
+            self._append_states()
+        return n
+
+    def _append_states(self) -> None:
+        """ Copies the staged vehicle states into the vehicles chunk """
+        n = len(self._staged_states)
+        if not n:
+            return
+        states = _to_array(self._staged_states, 5)
+        runs = _to_array(self._staged_runs, 4)
+        counts = runs[:, 3].astype(int)
+        t, road, green = (np.repeat(runs[:, i], counts) for i in range(3))
+        self._append('vehicles', n, (t, states[:, 0], road, states[:, 1], states[:, 2], states[:, 3], states[:, 4],
+                                     green))
+        self._staged_states, self._staged_runs = [], []
+
+    def _record_slots(self, t: float, engine: NumpyEngine, slots: np.ndarray) -> int:
+        """ Appends the vehicles rows of a simulation updated by an array engine, read from the engine arrays
+        at the slots of its vehicles. Returns their number """
+        if len(slots):
+            road = engine.road[slots]
+            self._append('vehicles', len(slots), (t, engine.index[slots], road, engine.x[slots], engine.v[slots],
+                                                   engine.a[slots], engine.stopped[slots], self._green_roads[road]))
+        return len(slots)
+
+    def _append(self, table: str, n: int, columns: Tuple) -> None:
+        """ Copies n rows into the chunk of a table, given as a sequence or a scalar per column in the table
+        order, and writes the chunk once full """
+        i = self._n_rows[table]
+        if i + n > self.chunk_size:
+            # Fill up the chunk, then append the rest
+            k = self.chunk_size - i
+            self._append(table, k, tuple(values[:k] if isinstance(values, (list, np.ndarray)) else values
+                                         for values in columns))
+            self._append(table, n - k, tuple(values[k:] if isinstance(values, (list, np.ndarray)) else values
+                                             for values in columns))
+            return
+        for column, values in zip(self._chunks[table], columns):
+            column[i:i + n] = values
+        self._n_rows[table] = i + n
+        if i + n == self.chunk_size:
+            self._write(table)
+
+    def _stage(self, table: str, row: Tuple) -> None:
+        """ Stages a row of a table, and copies the staged rows into the chunk once there are STAGED_ROWS """
+        staged = self._staged[table]
+        staged.append(row)
+        if len(staged) >= STAGED_ROWS:
+            self._append_staged(table)
+
+    def _append_staged(self, table: str) -> None:
+        """ Copies the staged rows of a table into its chunk """
+        staged = self._staged[table]
+        if staged:
+            self._append(table, len(staged), tuple(_to_array(staged, len(TABLES[table])).T))
+            self._staged[table] = []
+
+    def _write_header(self, network: Optional[Dict] = None) -> None:
+        header = {'tables': {table: [[name, dtype[name].str] for name in dtype.names]
+                             for table, dtype in TABLES.items()},
+                  'network': network}
+        with open(os.path.join(self.directory, HEADER), 'w') as file:
+            json.dump(header, file)
+
+    def _network(self, sim) -> Dict:
+        """ Returns the description of the simulation network and of the recording rate """
+        return {'dt': sim.dt,
+                'every': self.every,
+                'roads': [road.points for road in sim.roads],
+                'traffic_signals': [{'roads': [[road.index for road in group] for group in signal.roads],
+                                     'cycle': signal.cycle,
+                                     'slow_distance': signal.slow_distance,
+                                     'slow_factor': signal.slow_factor,
+                                     'stop_distance': signal.stop_distance}
+                                    for signal in sim.traffic_signals],
+                'vehicle_size': [CAR.length, CAR.width]}
+
+    def _write(self, table: str) -> None:
+        """ Appends the filled rows of a table chunk to the column files """
+        n = self._n_rows[table]
+        for column, file in zip(self._chunks[table], self._files[table].values()):
+            column[:n].tofile(file)
+        self._n_rows[table] = 0
+
+    def flush(self) -> None:
+        """ Writes the buffered rows """
+        self._append_states()
+        for table, files in self._files.items():
+            self._append_staged(table)
+            self._write(table)
+            for file in files.values():
+                file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        for files in self._files.values():
+            for file in files.values():
+                file.close()
+
+
+def _to_array(rows: List[Tuple], n_columns: int) -> np.ndarray:
+    """ Returns rows of numbers as a float array of shape (len(rows), n_columns) """
+    return np.fromiter(chain.from_iterable(rows), float, len(rows) * n_columns).reshape(-1, n_columns)
+
+
+def load_trajectory(directory: str, mmap: bool = True) -> Dict[str, Dict[str, np.ndarray]]:
+    """ Loads a recorded trajectory, {table: {column: array}}, memory-mapped and read-only by default.
+    The lengths of the columns are those of the files, so a trajectory can be read while being recorded """
+    with open(os.path.join(directory, HEADER)) as file:
+        header = json.load(file)
+    tables = {}
+    for table, columns in header['tables'].items():
+        dtypes = [(name, np.dtype(dtype)) for name, dtype in columns]
+        # Rows whose columns weren't all written yet are left out
+        n = min(os.path.getsize(os.path.join(directory, f'{table}.{name}')) // dtype.itemsize for name, dtype in dtypes)
+        tables[table] = {}
+        for name, dtype in dtypes:
+            path = os.path.join(directory, f'{table}.{name}')
+            if not n:
+                tables[table][name] = np.empty(0, dtype)
+            elif mmap:
+                tables[table][name] = np.memmap(path, dtype, mode='r', shape=(n,))
+            else:
+                tables[table][name] = np.fromfile(path, dtype, count=n)
+    return tables
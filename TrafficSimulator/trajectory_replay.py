@@ -0,0 +1,135 @@
+import json
+import os
+from argparse import ArgumentParser
+from typing import List, Set
+
+import numpy as np
+
+from TrafficSimulator.road import Road, CurvedRoad
+from TrafficSimulator.traffic_signal import TrafficSignal
+from TrafficSimulator.trajectory_recorder import HEADER, load_trajectory
+
+_EPSILON = 1e-6  # Tolerance of the time comparisons, recorded times being sums of time steps
+
+
+class ReplayVehicle:
+    """ A recorded vehicle, with the attributes of Vehicle that the Window draws """
+    __slots__ = ('index', 'x', 'v', 'is_stopped', 'length', 'width')
+
+    def __init__(self, index: int, x: float, v: float, is_stopped: bool, length: float, width: float):
+        self.index = index
+        self.x = x
+        self.v = v
+        self.is_stopped = is_stopped
+        self.length = length
+        self.width = width
+
+
+class TrajectoryReplay:
+    """
+    Plays back a trajectory recorded by TrajectoryRecorder, without a simulation: the network is rebuilt from
+    the trajectory header, and the vehicles of the current frame are placed on its roads. Exposes the
+    attributes of Simulation that the Window draws, so Window(TrajectoryReplay(directory)) displays the replay,
+    see play(). The frames are found by binary search of the recorded update times, so only the rows of the
+    current frame are read from the memory-mapped columns
+    """
+
+    def __init__(self, directory: str, speed: float = 1.0):
+        with open(os.path.join(directory, HEADER)) as file:
+            network = json.load(file)['network']
+        if network is None:
+            raise ValueError(f"The trajectory {directory} has no recorded update")
+        self.roads: List[Road] = [CurvedRoad([tuple(point) for point in points], i) if len(points) > 2 else
+                                  Road(tuple(points[0]), tuple(points[1]), i)
+                                  for i, points in enumerate(network['roads'])]
+        self.traffic_signals: List[TrafficSignal] = [
+            TrafficSignal([[self.roads[i] for i in group] for group in signal['roads']],
+                          [tuple(cycle) for cycle in signal['cycle']],
+                          signal['slow_distance'], signal['slow_factor'], signal['stop_distance'])
+            for signal in network['traffic_signals']]
+        self._vehicle_size = tuple(network['vehicle_size'])
+
+        trajectory = load_trajectory(directory)
+        self._vehicles = trajectory['vehicles']
+        # The recorded updates, with the vehicles rows of each
+        self._frames = trajectory['frames']
+        self._times: np.ndarray = self._frames['t']
+        # The signals table is small, every traffic signal's changes are loaded as (times, cycle indexes)
+        signals = {name: np.asarray(column) for name, column in trajectory['signals'].items()}
+        self._signal_changes = [(signals['t'][signals['signal'] == i], signals['cycle_index'][signals['signal'] == i])
+                                for i in range(len(self.traffic_signals))]
+        self.start_t: float = float(self._times[0]) if len(self._times) else 0.0
+        self.end_t: float = float(self._times[-1]) if len(self._times) else self.start_t
+
+        self.speed: float = speed  # Playback speed, simulated seconds per second
+        self.paused: bool = False
+        self.t: float = self.start_t
+        self.max_gen = None
+        self.n_vehicles_on_map: int = 0
+        self.non_empty_roads: Set[int] = set()
+        self.seek(self.start_t)
+
+    def seek(self, t: float) -> None:
+        """ Shows the last frame recorded at or before time t, within the recorded times """
+        self.t = min(max(t, self.start_t), self.end_t)
+        self._load_frame()
+
+    def step(self, n_frames: int = 1) -> None:
+        """ Moves n recorded frames forward, or backwards if negative """
+        if len(self._times):
+            i = int(np.searchsorted(self._times, self.t + _EPSILON, 'right')) - 1 + n_frames
+            self.seek(float(self._times[min(max(i, 0), len(self._times) - 1)]))
+
+    def advance(self, seconds: float) -> None:
+        """ Moves forward by the given wall clock seconds at the playback speed, unless paused """
+        if not self.paused:
+            self.seek(self.t + seconds * self.speed)
+
+    def _load_frame(self) -> None:
+        for i in self.non_empty_roads:
+            self.roads[i].vehicles.clear()
+        self.non_empty_roads = set()
+        self.n_vehicles_on_map = 0
+
+        # The last update recorded at or before t, however long ago, as updates skipped by adaptive stepping
+        # aren't recorded
+        frame = int(np.searchsorted(self._times, self.t + _EPSILON, 'right')) - 1
+        if frame >= 0:
+            start = int(self._frames['start'][frame])
+            end = start + int(self._frames['n_vehicles'][frame])
+            columns = [self._vehicles[name][start:end].tolist() for name in ('vehicle', 'road', 'x', 'v', 'stopped')]
+            length, width = self._vehicle_size
+            for index, road, x, v, stopped in zip(*columns):
+                self.roads[road].vehicles.append(ReplayVehicle(index, x, v, stopped, length, width))
+                self.non_empty_roads.add(road)
+            self.n_vehicles_on_map = end - start
+
+        for signal, (times, cycle_indexes) in zip(self.traffic_signals, self._signal_changes):
+            i = int(np.searchsorted(times, self.t + _EPSILON, 'right')) - 1
+            signal.current_cycle_index = int(cycle_indexes[i]) if i >= 0 else 0
+
+
+def play(directory: str, speed: float = 1.0, start: float = 0.0, fps: int = 60) -> None:
+    """
+    Replays a recorded trajectory in the Window until it's closed. Keys: space pauses, the right and left
+    arrows seek 5 seconds forward and backwards (a frame when paused), the up and down arrows double and
+    halve the speed, home and end seek the start and the end
+    """
+    import pygame
+    from TrafficSimulator.window import Window
+    replay = TrajectoryReplay(directory, speed)
+    replay.seek(start)
+    window = Window(replay)
+    clock = pygame.time.Clock()
+    while not window.closed:
+        window.update()
+        replay.advance(clock.tick(fps) / 1000)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Replays a trajectory recorded by TrafficSimulator.trajectory_recorder")
+    parser.add_argument("directory", help="Trajectory directory")
+    parser.add_argument("--speed", metavar='N', type=float, default=1.0, help="Playback speed")
+    parser.add_argument("--start", metavar='T', type=float, default=0.0, help="Start time, seconds")
+    args = parser.parse_args()
+    play(args.directory, args.speed, args.start)
@@ -1,21 +1,38 @@
+from math import sqrt
 from typing import List, Tuple
 
-import numpy as np
+
+class VehicleParams:
+    """ The constant parameters of a class of vehicles, shared by all its vehicles """
+    __slots__ = ('length', 'width', 's0', 'T', 'v_max', 'a_max', 'b_max', 'sqrt_ab')
+
+    def __init__(self, length: float = 4, width: float = 2, s0: float = 4, T: float = 1,
+                 v_max: float = 16.6, a_max: float = 1.44, b_max: float = 4.61):
+        self.length = length
+        self.width = width
+        self.s0 = s0
+        self.T = T
+        self.v_max = v_max  # Max velocity
+        self.a_max = a_max  # Max positive acceleration
+        self.b_max = b_max  # Max negative acceleration
+        self.sqrt_ab = 2 * sqrt(a_max * b_max)
+
+
+CAR = VehicleParams()
 
 
 class Vehicle:
-    def __init__(self, path: List[int]):
-        self.index = 0
-        self.length = 4
-        self.width = 2
+    __slots__ = ('params', 'index', 'v_max', 'v', 'a', 'x', 'is_stopped', '_last_time_stopped', '_waiting_time',
+                 'path', 'current_road_index', 'position')
 
-        self.s0 = 4
-        self.T = 1
-        self.v_max = 16.6  # Max velocity
-        self.a_max = 1.44  # Max positive acceleration
-        self.b_max = 4.61  # Max negative acceleration
-        self.sqrt_ab = 2 * np.sqrt(self.a_max * self.b_max)
-        self._v_max = self.v_max
+    def __init__(self, path: List[int], params: VehicleParams = CAR):
+        self.params: VehicleParams = params
+        self.reset(path)
+
+    def reset(self, path: List[int]) -> None:
+        """ Sets the vehicle to the start of the given path, used to reuse vehicles that left the map """
+        self.index = 0
+        self.v_max = self.params.v_max  # Max velocity, lowered near red traffic signals
 
         self.v = self.v_max  # Velocity
         self.a = 0  # Acceleration
@@ -31,6 +48,22 @@ class Vehicle:
         # Used for collision detection, value set upon adding it to the map in vehicle.update()
         self.position: Tuple = (None, None)
 
+    @property
+    def length(self) -> float:
+        return self.params.length
+
+    @property
+    def width(self) -> float:
+        return self.params.width
+
+    @property
+    def s0(self) -> float:
+        return self.params.s0
+
+    @property
+    def _v_max(self) -> float:
+        return self.params.v_max
+
     def __str__(self):
         return f'Vehicle {self.index}'
 
@@ -55,23 +88,21 @@ class Vehicle:
             self.x += self.v * dt + self.a * dt * dt / 2
 
         # Update acceleration
+        params = self.params
         alpha = 0
         if lead:
-            delta_x = lead.x - self.x - lead.length
+            delta_x = lead.x - self.x - lead.params.length
             delta_v = self.v - lead.v
 
-            alpha = (self.s0 + max(0, self.T * self.v + delta_v * self.v / self.sqrt_ab)) / delta_x
+            alpha = (params.s0 + max(0, params.T * self.v + delta_v * self.v / params.sqrt_ab)) / delta_x
 
-        self.a = self.a_max * (1 - (self.v / self.v_max) ** 4 - alpha ** 2)
+        self.a = params.a_max * (1 - (self.v / self.v_max) ** 4 - alpha ** 2)
 
         if self.is_stopped:
-            self.a = -self.b_max * self.v / self.v_max
+            self.a = -params.b_max * self.v / self.v_max
 
         # Update position
-        sin, cos = road.angle_sin, road.angle_cos
-        x = road.start[0] + cos * self.x
-        y = road.start[1] + sin * self.x
-        self.position = x, y
+        self.position = road.position(self.x)
 
     def stop(self, t):
         if not self.is_stopped:
@@ -85,7 +116,7 @@ class Vehicle:
             self.is_stopped = False
 
     def slow(self, traffic_light_slow_factor):
-        self.v_max = self._v_max * traffic_light_slow_factor
+        self.v_max = self.params.v_max * traffic_light_slow_factor
 
     def unslow(self):
-        self.v_max = self._v_max
+        self.v_max = self.params.v_max
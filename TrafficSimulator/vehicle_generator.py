@@ -1,13 +1,16 @@
-from typing import List, Dict, Optional
+from math import inf
+from typing import Callable, List, Dict, KeysView, Optional, Tuple
 
-from numpy.random import randint
+import numpy as np
 
 from TrafficSimulator.road import Road
 from TrafficSimulator.vehicle import Vehicle
 
 
 class VehicleGenerator:
-    def __init__(self, vehicle_rate: int, paths: List[List], inbound_roads: Dict[int, Road]):
+    def __init__(self, vehicle_rate: int, paths: List[List], inbound_roads: Dict[int, Road],
+                 vehicle_factory: Callable[[List[int]], Vehicle] = Vehicle,
+                 rng: Optional[np.random.Generator] = None, arrivals: Optional[np.ndarray] = None):
         self._vehicle_rate: int = vehicle_rate
         self._paths: List[List] = paths
         self._prev_gen_time: float = 0
@@ -15,20 +18,60 @@ class VehicleGenerator:
         # Storing the list of the first roads of the vehicle paths. Used in the update() function
         # upon vehicle generation to check if there's sufficient space in the road to add a vehicle
         self._inbound_roads: Dict[int, Road] = inbound_roads
+        self._vehicle_factory: Callable[[List[int]], Vehicle] = vehicle_factory
+        # The random stream of the generated vehicles' paths, unseeded by default
+        self._rng: np.random.Generator = rng if rng is not None else np.random.default_rng()
+
+        # An arrival trace to replay instead of sampling arrivals, see TrafficSimulator.arrival_trace.
+        # The cursor is the index of the next arrival
+        self._arrivals: Optional[np.ndarray] = arrivals
+        self._cursor: int = 0
+
+    def copy(self, roads: List[Road], vehicle_factory: Callable[[List[int]], Vehicle]) -> 'VehicleGenerator':
+        """ Returns a generator with the same parameters and state, adding vehicles to the given roads """
+        inbound_roads = {i: roads[i] for i in self._inbound_roads}
+        generator = VehicleGenerator(self._vehicle_rate, self._paths, inbound_roads, vehicle_factory,
+                                     arrivals=self._arrivals)
+        generator.set_state(self.get_state())
+        return generator
+
+    @property
+    def inbound_roads(self) -> KeysView[int]:
+        """ Returns the indexes of the first roads of the generator's paths """
+        return self._inbound_roads.keys()
+
+    def get_state(self) -> Tuple:
+        """ Returns the dynamic state of the generator, including its random stream """
+        return self._prev_gen_time, self._rng.bit_generator.state, self._cursor
+
+    def set_state(self, state: Tuple) -> None:
+        """ Sets the dynamic state of the generator, see get_state() """
+        self._prev_gen_time, self._rng.bit_generator.state, self._cursor = state
+
+    def next_arrival(self, n_vehicles_generated: int) -> float:
+        """ Returns the earliest time at which update() may generate a vehicle """
+        if self._arrivals is not None:
+            return float(self._arrivals[self._cursor]['t']) if self._cursor < len(self._arrivals) else inf
+        if not n_vehicles_generated:
+            return -inf
+        return self._prev_gen_time + 60 / self._vehicle_rate
 
     def _generate_vehicle(self) -> Vehicle:
         """Returns a random vehicle from self.vehicles with random proportions"""
         total = sum(weight for weight, path in self._paths)
-        r = randint(0, total)
+        r = self._rng.integers(0, total)
         for (weight, path) in self._paths:
             r -= weight
             if r <= 0:
-                return Vehicle(path)
+                return self._vehicle_factory(path)
 
     def update(self, curr_t: float, n_vehicles_generated: int) -> Optional[int]:
         """Generates a vehicle if the generation conditions are satisfied
         :return: road index if a vehicle was generated, else None
         """
+        if self._arrivals is not None:
+            return self._replay(curr_t, n_vehicles_generated)
+
         # If there's no vehicles on the map, or if the time elapsed after last
         # generation is greater than the vehicle rate, generate a vehicle
         time_elapsed = curr_t - self._prev_gen_time >= 60 / self._vehicle_rate
@@ -42,3 +85,24 @@ class VehicleGenerator:
                 self._prev_gen_time = curr_t
                 return road.index
         return None
+
+    def _replay(self, curr_t: float, n_vehicles_generated: int) -> Optional[int]:
+        """Adds the next vehicle of the arrival trace once its arrival time is reached. A vehicle which
+        doesn't fit in its road waits until there's sufficient space, keeping the trace order
+        :return: road index if a vehicle was generated, else None
+        """
+        if self._cursor == len(self._arrivals):
+            return None
+        t, path = self._arrivals[self._cursor]
+        if curr_t < t:
+            return None
+        weight, path = self._paths[path]
+        vehicle: Vehicle = self._vehicle_factory(path)
+        road: Road = self._inbound_roads[path[0]]
+        if not road.vehicles or road.vehicles[-1].x > vehicle.s0 + vehicle.length:
+            vehicle.index = n_vehicles_generated
+            road.vehicles.append(vehicle)
+            self._prev_gen_time = curr_t
+            self._cursor += 1
+            return road.index
+        return None
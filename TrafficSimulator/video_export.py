@@ -0,0 +1,156 @@
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import threading
+import zlib
+from argparse import ArgumentParser
+from typing import Optional, Tuple
+
+import numpy as np
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.avi', '.gif')  # Encoded by ffmpeg, other paths are directories
+
+
+class VideoExporter:
+    """
+    Streams the frames drawn by a Window to an image sequence, a directory of PNG files, or to an animated
+    file encoded by ffmpeg, which must then be installed (the path extension is one of VIDEO_EXTENSIONS).
+    The frames are copied from the window surface into a bounded queue, and written by a worker thread, so
+    the simulation only waits when the writer falls queue_size frames behind. The worker encodes without
+    holding the GIL: zlib compresses the PNG files, and ffmpeg runs in its own process. Call close() to
+    finish the video. Use attach() or export_trajectory() to render without a display
+    """
+
+    def __init__(self, path: str, fps: float = 30, queue_size: int = 32):
+        self.path: str = path
+        self.fps: float = fps
+        self.n_frames: int = 0
+        self._video: bool = path.lower().endswith(VIDEO_EXTENSIONS)
+        if self._video and not shutil.which('ffmpeg'):
+            raise RuntimeError(f"Exporting {path} requires ffmpeg, install it or export to a directory of frames")
+        if not self._video:
+            os.makedirs(path, exist_ok=True)
+        self._frames: queue.Queue = queue.Queue(queue_size)
+        self._error: Optional[BaseException] = None
+        self._worker = threading.Thread(target=self._write_frames, daemon=True)
+        self._worker.start()
+
+    def attach(self, sim) -> None:
+        """ Renders the simulation offscreen from now on, a frame per 1 / fps simulated seconds, to the video.
+        Must be called before any window is opened in the process: the offscreen video driver is only chosen
+        when pygame's display is initialised """
+        import pygame
+        from TrafficSimulator.render_policy import RenderPolicy
+        if sim._gui:
+            raise RuntimeError("The simulation already has a window, attach the exporter before init_gui()")
+        if pygame.display.get_init() and pygame.display.get_driver() != 'dummy':
+            raise RuntimeError(f"pygame's display is already initialised with the {pygame.display.get_driver()} "
+                               f"driver, attach the exporter before opening any window")
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        sim.init_gui(RenderPolicy(every=max(1, round(1 / (self.fps * sim.dt)))))
+        sim._gui.exporter = self
+
+    def write(self, surface) -> None:
+        """ Queues a copy of the surface as the next frame """
+        import pygame
+        if self._error:
+            raise self._error
+        self._frames.put((surface.get_size(), pygame.image.tobytes(surface, 'RGB')))
+        self.n_frames += 1
+
+    def close(self) -> None:
+        """ Writes the queued frames and finishes the video """
+        self._frames.put(None)
+        self._worker.join()
+        if self._error:
+            raise self._error
+
+    def _write_frames(self) -> None:
+        process: Optional[subprocess.Popen] = None
+        i = 0
+        try:
+            while True:
+                frame = self._frames.get()
+                if frame is None:
+                    break
+                size, pixels = frame
+                if self._video:
+                    process = process or self._start_encoder(size)
+                    process.stdin.write(pixels)
+                else:
+                    with open(os.path.join(self.path, f'frame_{i:06d}.png'), 'wb') as file:
+                        file.write(_png(pixels, size))
+                i += 1
+        except BaseException as error:
+            if isinstance(error, BrokenPipeError) and process and process.wait():
+                error = RuntimeError(f"ffmpeg exited with status {process.returncode} encoding {self.path}")
+            self._error = error
+            # Keep consuming, so that the producer doesn't block on the full queue
+            while self._frames.get() is not None:
+                pass
+        finally:
+            if process:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass  # ffmpeg exited, its exit status tells why
+                exit_status = process.wait()
+                if exit_status and not self._error:
+                    self._error = RuntimeError(f"ffmpeg exited with status {exit_status} encoding {self.path}")
+
+    def _start_encoder(self, size: Tuple[int, int]) -> subprocess.Popen:
+        """ Starts ffmpeg, reading raw RGB frames of the given size from its standard input """
+        # Most players only decode the yuv420p pixel format, which GIFs don't use
+        pixel_format = [] if self.path.lower().endswith('.gif') else ['-pix_fmt', 'yuv420p']
+        return subprocess.Popen(['ffmpeg', '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                                 '-s', f'{size[0]}x{size[1]}', '-r', str(self.fps), '-i', '-', *pixel_format,
+                                 self.path], stdin=subprocess.PIPE)
+
+
+def _png(pixels: bytes, size: Tuple[int, int]) -> bytes:
+    """ Returns the PNG file of an RGB image """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    width, height = size
+    # Every scanline starts with its filter type, 0 for none
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width * 3)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)  # 8-bit RGB
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows, 6)) +
+            chunk(b'IEND', b''))
+
+
+def export_trajectory(directory: str, path: str, fps: float = 30, speed: float = 1.0,
+                      queue_size: int = 32) -> int:
+    """ Renders a trajectory recorded by TrajectoryRecorder offscreen, at the given playback speed, to a video
+    or a directory of frames, see VideoExporter. Returns the number of frames """
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    from TrafficSimulator.trajectory_replay import TrajectoryReplay
+    from TrafficSimulator.window import Window
+    replay = TrajectoryReplay(directory, speed)
+    window = Window(replay)
+    exporter = VideoExporter(path, fps, queue_size)
+    window.exporter = exporter
+    try:
+        while True:
+            window.update(force=True)
+            if replay.t >= replay.end_t:
+                break
+            replay.advance(1 / fps)
+    finally:
+        exporter.close()
+    return exporter.n_frames
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Exports a recorded trajectory to a video without a display")
+    parser.add_argument("directory", help="Trajectory directory, see TrafficSimulator.trajectory_recorder")
+    parser.add_argument("path", help=f"Output directory of PNG frames, or file ({', '.join(VIDEO_EXTENSIONS)})")
+    parser.add_argument("--fps", metavar='F', type=float, default=30, help="Frames per second of the video")
+    parser.add_argument("--speed", metavar='N', type=float, default=1.0, help="Playback speed")
+    args = parser.parse_args()
+    n_frames = export_trajectory(args.directory, args.path, args.fps, args.speed)
+    print(f"Exported {n_frames} frames to {args.path}")
@@ -1,7 +1,13 @@
+from typing import List, Optional, Tuple
+
 import numpy as np
 import pygame
 from pygame.draw import polygon
 
+from TrafficSimulator.render_policy import RenderPolicy
+from TrafficSimulator.trajectory_replay import TrajectoryReplay
+from TrafficSimulator.video_export import VideoExporter
+
 
 # # For debugging purposes
 # DRAW_VEHICLE_IDS = True
@@ -10,12 +16,18 @@ from pygame.draw import polygon
 
 
 class Window:
-    def __init__(self, simulation):
+    """ Displays a Simulation, updated by the simulation, or a TrajectoryReplay, whose playback is controlled
+    with the keyboard, see TrafficSimulator.trajectory_replay.play. The render policy sets which updates
+    draw a frame """
+
+    def __init__(self, simulation, policy: Optional[RenderPolicy] = None):
         self._width = 1000
         self._height = 630
 
         self.closed: bool = False
         self._sim = simulation
+        self.policy: RenderPolicy = policy or RenderPolicy()
+        self.exporter: Optional[VideoExporter] = None  # Receives the drawn frames, see video_export
 
         self._background_color = (235, 235, 235)
         self._screen = pygame.display.set_mode((self._width, self._height))
@@ -29,9 +41,40 @@ class Window:
         self._mouse_last = (0, 0)
         self._mouse_down = False
 
-    def update(self) -> None:
-        self._draw()
-        pygame.display.update()
+        # The background and the roads, rendered for the (zoom, offset) view, and the screen areas drawn
+        # over it in the last frame, restored from it before drawing the next
+        self._background: Optional[pygame.Surface] = None
+        self._background_view: Optional[Tuple] = None
+        self._dirty_rects: List[pygame.Rect] = []
+
+        # The straight pieces of all the roads, keyed by road key + arc length, see _draw_vehicles
+        roads = self._sim.roads
+        road_length = np.array([road.length for road in roads], dtype=float)
+        self._road_length: np.ndarray = road_length
+        self._road_key: np.ndarray = np.concatenate(([0], np.cumsum(road_length + 1)[:-1]))
+        pieces = [(key + offset, offset, start, cos, sin)
+                  for road, key in zip(roads, self._road_key) for offset, length, start, cos, sin in road.pieces]
+        self._piece_key: np.ndarray = np.array([piece[0] for piece in pieces], dtype=float)
+        self._piece_offset: np.ndarray = np.array([piece[1] for piece in pieces], dtype=float)
+        self._piece_start: np.ndarray = np.array([piece[2] for piece in pieces], dtype=float).reshape(-1, 2)
+        self._piece_cos: np.ndarray = np.array([piece[3] for piece in pieces], dtype=float)
+        self._piece_sin: np.ndarray = np.array([piece[4] for piece in pieces], dtype=float)
+
+    def update(self, force: bool = False) -> None:
+        """ Draws a frame if forced or if the render policy says so, else polls the events when due """
+        if force or self.policy.frame_due():
+            rects = self._draw()
+            if rects is None:
+                pygame.display.update()
+            else:
+                pygame.display.update(rects)
+            if self.exporter:
+                self.exporter.write(self._screen)
+            self._poll_events()
+        elif self.policy.poll_due():
+            self._poll_events()
+
+    def _poll_events(self) -> None:
         for event in pygame.event.get():
             # Quit program if window is closed
             if event.type == pygame.QUIT:
@@ -59,6 +102,27 @@ class Window:
                     self._offset = ((x2 - x1) / self._zoom, (y2 - y1) / self._zoom)
             elif event.type == pygame.MOUSEBUTTONUP:
                 self._mouse_down = False
+            elif event.type == pygame.KEYDOWN and isinstance(self._sim, TrajectoryReplay):
+                self._control_replay(event.key)
+
+    def _control_replay(self, key) -> None:
+        replay = self._sim
+        if key == pygame.K_SPACE:
+            replay.paused = not replay.paused
+        elif key in (pygame.K_RIGHT, pygame.K_LEFT):
+            direction = 1 if key == pygame.K_RIGHT else -1
+            if replay.paused:
+                replay.step(direction)
+            else:
+                replay.seek(replay.t + direction * 5)
+        elif key == pygame.K_UP:
+            replay.speed *= 2
+        elif key == pygame.K_DOWN:
+            replay.speed /= 2
+        elif key == pygame.K_HOME:
+            replay.seek(replay.start_t)
+        elif key == pygame.K_END:
+            replay.seek(replay.end_t)
 
     def _convert(self, x, y=None):
         """Converts simulation coordinates to screen coordinates"""
@@ -79,8 +143,9 @@ class Window:
                 int(-self._offset[1] + (y - self._height / 2) / self._zoom))
 
     def _rotated_box(self, pos, size, angle=None, cos=None, sin=None, centered=True,
-                     color=(0, 0, 255)):
-        """Draws a rectangle center at *pos* with size *size* rotated anti-clockwise by *angle*."""
+                     color=(0, 0, 255), surface=None) -> pygame.Rect:
+        """Draws a rectangle center at *pos* with size *size* rotated anti-clockwise by *angle*,
+        on the screen or the given surface. Returns the bounding rectangle of the drawn area"""
 
         def vertex(e1, e2):
             return (x + (e1 * l * cos + e2 * h * sin) / 2,
@@ -95,7 +160,7 @@ class Window:
         else:
             points = self._convert([vertex(*e) for e in [(0, -1), (0, 1), (2, 1), (2, -1)]])
 
-        polygon(self._screen, color, points)
+        return polygon(surface or self._screen, color, points)
 
         # # For debugging purposes
         # width = 0 if FILL_POLYGONS else 2
@@ -106,7 +171,7 @@ class Window:
         # polygon(self._screen, color, points, width)
         # return screen_x, screen_y
 
-    def _draw_arrow(self, pos, size, angle=None, cos=None, sin=None, color=(150, 150, 190)) -> None:
+    def _draw_arrow(self, pos, size, angle=None, cos=None, sin=None, color=(150, 150, 190), surface=None) -> None:
         if angle:
             cos, sin = np.cos(angle), np.sin(angle)
         self._rotated_box(pos,
@@ -114,36 +179,40 @@ class Window:
                           cos=(cos - sin) / np.sqrt(2),
                           sin=(cos + sin) / np.sqrt(2),
                           color=color,
-                          centered=False)
+                          centered=False,
+                          surface=surface)
         self._rotated_box(pos,
                           size,
                           cos=(cos + sin) / np.sqrt(2),
                           sin=(sin - cos) / np.sqrt(2),
                           color=color,
-                          centered=False)
+                          centered=False,
+                          surface=surface)
 
-    def _draw_roads(self) -> None:
+    def _draw_roads(self, surface: pygame.Surface) -> None:
         # road_index_coordinates = [] # For debugging purposes
         for road in self._sim.roads:
-            # Draw road background
-            self._rotated_box(
-                road.start,
-                (road.length, 3.7),
-                cos=road.angle_cos,
-                sin=road.angle_sin,
-                color=(180, 180, 220),
-                centered=False
-            )
-
-            # # For debugging purposes
-            # road_index_coordinates.append((road.index, screen_x, screen_y))
-
-            # Draw road arrow
-            if road.length > 5:
-                for i in np.arange(-0.5 * road.length, 0.5 * road.length, 10):
-                    pos = (road.start[0] + (road.length / 2 + i + 3) * road.angle_cos,
-                           road.start[1] + (road.length / 2 + i + 3) * road.angle_sin)
-                    self._draw_arrow(pos, (-1.25, 0.2), cos=road.angle_cos, sin=road.angle_sin)
+            for offset, length, start, cos, sin in road.pieces:
+                # Draw road background
+                self._rotated_box(
+                    start,
+                    (length, 3.7),
+                    cos=cos,
+                    sin=sin,
+                    color=(180, 180, 220),
+                    centered=False,
+                    surface=surface
+                )
+
+                # # For debugging purposes
+                # road_index_coordinates.append((road.index, screen_x, screen_y))
+
+                # Draw road arrow
+                if length > 5:
+                    for i in np.arange(-0.5 * length, 0.5 * length, 10):
+                        pos = (start[0] + (length / 2 + i + 3) * cos,
+                               start[1] + (length / 2 + i + 3) * sin)
+                        self._draw_arrow(pos, (-1.25, 0.2), cos=cos, sin=sin, surface=surface)
 
         # # For debugging purposes
         # if DRAW_ROAD_IDS:
@@ -152,27 +221,38 @@ class Window:
         #         text_road_index = self._text_font.render(f'{cords[0]}', True, (0, 0, 0))
         #         self._screen.blit(text_road_index, (cords[1] - 5, cords[2] - 5))
 
-    def _draw_vehicle(self, vehicle, road) -> None:
-        l, h = vehicle.length, vehicle.width
-        sin, cos = road.angle_sin, road.angle_cos
-        x = road.start[0] + cos * vehicle.x
-        y = road.start[1] + sin * vehicle.x
-        self._rotated_box((x, y), (l, h), cos=cos, sin=sin, centered=True)
-
-        # # For debugging purposes
-        # screen_x, screen_y = self._rotated_box((x, y), (l, h), cos=cos, sin=sin, centered=True)
-        # if DRAW_VEHICLE_IDS:
-        #     text_road_index = self._text_font.render(f'{vehicle.index}', True, (255, 255, 255),
-        #                                              (0, 0, 0))
-        #     self._screen.blit(text_road_index, (screen_x - 5, screen_y - 5))
-
-    def _draw_vehicles(self) -> None:
+    def _draw_vehicles(self) -> List[pygame.Rect]:
+        """ Draws the vehicles as rotated boxes, like _rotated_box, computing the screen coordinates of all
+        their corners at once """
+        roads, xs, lengths, widths = [], [], [], []
         for i in self._sim.non_empty_roads:
-            road = self._sim.roads[i]
-            for vehicle in road.vehicles:
-                self._draw_vehicle(vehicle, road)
+            vehicles = self._sim.roads[i].vehicles
+            roads += [i] * len(vehicles)
+            xs += [vehicle.x for vehicle in vehicles]
+            lengths += [vehicle.length for vehicle in vehicles]
+            widths += [vehicle.width for vehicle in vehicles]
+        if not xs:
+            return []
+        road, x = np.array(roads), np.array(xs)
+        # The road pieces of the vehicles, positions past the road ends extending the first and last pieces
+        key = self._road_key[road] + np.clip(x, 0, self._road_length[road])
+        piece = np.searchsorted(self._piece_key, key, side='right') - 1
+        cos, sin = self._piece_cos[piece, None], self._piece_sin[piece, None]
+        x = (x - self._piece_offset[piece])[:, None]
+        center_x = self._piece_start[piece, 0, None] + cos * x
+        center_y = self._piece_start[piece, 1, None] + sin * x
 
-    def _draw_signals(self) -> None:
+        # The corners of every vehicle, in the order of _rotated_box
+        l, h = np.array(lengths)[:, None], np.array(widths)[:, None]
+        e1, e2 = np.array([-1, -1, 1, 1]), np.array([-1, 1, 1, -1])
+        corner_x = center_x + (e1 * l * cos + e2 * h * sin) / 2
+        corner_y = center_y + (e1 * l * sin - e2 * h * cos) / 2
+        screen_x = (self._width / 2 + (corner_x + self._offset[0]) * self._zoom).astype(int)
+        screen_y = (self._height / 2 + (corner_y + self._offset[1]) * self._zoom).astype(int)
+        return [polygon(self._screen, (0, 0, 255), points) for points in np.stack((screen_x, screen_y), 2).tolist()]
+
+    def _draw_signals(self) -> List[pygame.Rect]:
+        rects = []
         for signal in self._sim.traffic_signals:
             for i in range(len(signal.roads)):
                 red, green = (255, 0, 0), (0, 255, 0)
@@ -186,28 +266,50 @@ class Window:
                     a = 0
                     position = ((1 - a) * road.end[0] + a * road.start[0],
                                 (1 - a) * road.end[1] + a * road.start[1])
-                    self._rotated_box(position, (1, 3),
-                                      cos=road.angle_cos, sin=road.angle_sin, color=color)
+                    rects.append(self._rotated_box(position, (1, 3),
+                                                   cos=road.angle_cos, sin=road.angle_sin, color=color))
+        return rects
 
-    def _draw_status(self):
+    def _draw_status(self) -> List[pygame.Rect]:
         def render(text, color=(0, 0, 0), background=self._background_color):
             return self._text_font.render(text, True, color, background)
 
+        if isinstance(self._sim, TrajectoryReplay):
+            replay = self._sim
+            t = render(f'Time: {replay.t:.1f} / {replay.end_t:.1f}')
+            playback = render('Paused' if replay.paused else f'Speed: {replay.speed:g}x')
+            n_vehicles_on_map = render(f'Vehicles On Map: {replay.n_vehicles_on_map}')
+            return [self._screen.blit(t, (10, 20)),
+                    self._screen.blit(playback, (10, 50)),
+                    self._screen.blit(n_vehicles_on_map, (10, 90))]
         t = render(f'Time: {self._sim.t:.1f}')
+        rects = []
         if self._sim.max_gen:
             n_max_gen = render(f'Max Gen: {self._sim.max_gen}')
-            self._screen.blit(n_max_gen, (10, 50))
+            rects.append(self._screen.blit(n_max_gen, (10, 50)))
         n_vehicles_generated = render(f'Vehicles Generated: {self._sim.n_vehicles_generated}')
         n_vehicles_on_map = render(f'Vehicles On Map: {self._sim.n_vehicles_on_map}')
         average_wait_time = render(f'Current Wait Time: {self._sim.current_average_wait_time:.1f}')
-        self._screen.blit(t, (10, 20))
-        self._screen.blit(n_vehicles_generated, (10, 70))
-        self._screen.blit(n_vehicles_on_map, (10, 90))
-        self._screen.blit(average_wait_time, (10, 120))
-
-    def _draw(self):
-        self._screen.fill(self._background_color)
-        self._draw_roads()
-        self._draw_vehicles()
-        self._draw_signals()
-        self._draw_status()
+        rects.append(self._screen.blit(t, (10, 20)))
+        rects.append(self._screen.blit(n_vehicles_generated, (10, 70)))
+        rects.append(self._screen.blit(n_vehicles_on_map, (10, 90)))
+        rects.append(self._screen.blit(average_wait_time, (10, 120)))
+        return rects
+
+    def _draw(self) -> Optional[List[pygame.Rect]]:
+        """ Draws a frame. The roads are drawn once per view, to the background, and the moving parts are
+        drawn over it. Returns the screen areas that changed, or None if the whole screen did """
+        view = (self._zoom, self._offset)
+        if view != self._background_view:
+            self._background = pygame.Surface(self._screen.get_size()).convert()
+            self._background.fill(self._background_color)
+            self._draw_roads(self._background)
+            self._background_view = view
+            self._screen.blit(self._background, (0, 0))
+            changed = None
+        else:
+            for rect in self._dirty_rects:
+                self._screen.blit(self._background, rect, rect)
+            changed = self._dirty_rects
+        self._dirty_rects = self._draw_vehicles() + self._draw_signals() + self._draw_status()
+        return None if changed is None else changed + self._dirty_rects
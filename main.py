@@ -3,6 +3,7 @@ from argparse import ArgumentParser
 from DefaultCycles import default_cycle
 from ReinforcementLearning import q_learning
 from Search import search
+from TrafficSimulator import RenderPolicy
 
 if __name__ == '__main__':
     parser = ArgumentParser(description="AI Traffic Lights Controller")
@@ -12,10 +13,17 @@ if __name__ == '__main__':
                         help="Number of evaluation episodes to run")
     parser.add_argument("-r", "--render", action='store_true',
                         help="Displays the simulation window")
+    parser.add_argument("--fps", metavar='F', type=float, default=None,
+                        help="With -r, draws at most F frames per second, the simulation running at full speed between")
+    parser.add_argument("--render-every", metavar='K', type=int, default=1,
+                        help="With -r, draws every K-th simulation update")
+    parser.add_argument("-s", "--seed", metavar='SEED', type=int, default=None,
+                        help="Seeds the episodes, equal seeds run the same traffic for every method")
     args = parser.parse_args()
+    render = RenderPolicy(args.fps, args.render_every) if args.render else False
     if args.method in ['fc', 'lqf']:
-        default_cycle(n_episodes=args.episodes, action_func_name=args.method, render=args.render)
+        default_cycle(n_episodes=args.episodes, action_func_name=args.method, render=render, seed=args.seed)
     elif args.method == 'qlearning':
-        q_learning(n_episodes=args.episodes, render=args.render)
+        q_learning(n_episodes=args.episodes, render=render, seed=args.seed)
     elif args.method == 'search':
-        search(episodes=args.episodes, render=args.render)
+        search(episodes=args.episodes, render=render, seed=args.seed)